@@ -2,55 +2,173 @@ import requests
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 import json
+import multiprocessing
 import os
 import time
-import random
-from bs4 import BeautifulSoup
-from config import (REJECTED_REPOS_FILE, SWE_BENCH_BASE_URL, SWE_BENCH_FILTER_PARAMS,
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import chain
+from pipeline import batched
+from scheduler import (create_swe_bench_scheduler, parse_retry_after, OUTCOME_SUCCESS, OUTCOME_ERROR,
+                       OUTCOME_THROTTLED, OUTCOME_CLIENT_ERROR)
+from registry import atomic_write_json, STATUS_REJECTED_PYTHON, STATUS_SWE_FAILED, STATUS_SWE_PASSED
+from github_api import create_github_session, github_get, github_graphql, GitHubRateLimiter
+from http_cache import get_default_cache
+from metrics import get_metrics
+from config import (REJECTED_REPOS_FILE, GITHUB_API_BASE_URL, GITHUB_MAX_WORKERS,
+                    PYTHON_PERCENTAGE_THRESHOLD, LANGUAGES_BACKEND, GITHUB_GRAPHQL_BATCH_SIZE, SWE_BENCH_BASE_URL, SWE_BENCH_FILTER_PARAMS,
                     SWE_BENCH_GREEN_LIST_FILE, SWE_BENCH_BLACKLIST_FILE,
                     SWE_BENCH_MAX_RETRIES, SWE_BENCH_BACKOFF_FACTOR,
-                    SWE_BENCH_MIN_DELAY, SWE_BENCH_MAX_DELAY,
-                    SWE_BENCH_MAX_CONSECUTIVE_REQUESTS, SWE_BENCH_LONG_PAUSE_DURATION,
+                    SWE_BENCH_MAX_IN_FLIGHT, SWE_BENCH_MAX_THROTTLE_RETRIES, REGISTRY_FLUSH_EVERY,
+                    SWE_BENCH_PARSER, SWE_BENCH_PARSE_WORKERS,
                     get_swe_bench_header, get_random_user_agent)
 
-# Filter by Python language percentage
-def Filterby_Python_percentage(cleaned_filtered_repos, headers):
-    filtered_by_python = []
-    rejected_by_python = []
-    for repo in cleaned_filtered_repos:
+def _fetch_languages(session, limiter, repo, headers):
+    # Returns the repo's {language: bytes} breakdown, or None if it could not be fetched
+    owner, repo_name = repo["full_name"].split("/", 1)
+    lang_url = f"{GITHUB_API_BASE_URL}/repos/{owner}/{repo_name}/languages"
+    try:
+        with get_metrics().profiled("python_percentage"):
+            lang_resp = github_get(session, lang_url, headers, limiter, cache=get_default_cache(),
+                                   endpoint="languages")
+        lang_resp.raise_for_status()
+        return lang_resp.json()
+    except Exception as e:
+        print(f"Error fetching languages for {repo['full_name']}: {e}")
+        return None
+
+
+LANGUAGES_GRAPHQL_FIELDS = "languages(first: 100, orderBy: {field: SIZE, direction: DESC}) { totalSize edges { size node { name } } }"
+
+
+def _fetch_languages_graphql(session, limiter, repos, headers, rest_limiter=None):
+    """
+    Fetches the language breakdown of every repo in `repos` with one aliased
+    GraphQL query. Returns one {language: bytes} dict (or None on error) per
+    repo, in order. Falls back to the REST endpoint if the whole query fails.
+    """
+    aliases = []
+    for index, repo in enumerate(repos):
         owner, repo_name = repo["full_name"].split("/", 1)
-        lang_url = f"https://api.github.com/repos/{owner}/{repo_name}/languages"
-        try:
-            lang_resp = requests.get(lang_url, headers=headers)
-            lang_resp.raise_for_status()
-            lang_data = lang_resp.json()
-            total_bytes = sum(lang_data.values())
-            python_bytes = lang_data.get("Python", 0)
-            python_percent = (python_bytes / total_bytes) * 100 if total_bytes > 0 else 0
-            if python_percent >= 75:
-                repo["python_percent"] = round(python_percent, 2)
-                filtered_by_python.append(repo)
-            else:
-                rejected_by_python.append(repo["html_url"])
-        except Exception as e:
-            print(f"Error fetching languages for {repo['full_name']}: {e}")
-    if rejected_by_python:
-        try:
-            # Load existing rejected repos if file exists
-            try:
-                with open(REJECTED_REPOS_FILE, "r", encoding="utf-8") as f:
-                    existing = json.load(f)
-                    if not isinstance(existing, list):
-                        existing = []
-            except (FileNotFoundError, json.JSONDecodeError):
-                existing = []
-            # Append new rejected repos
-            existing.extend(rejected_by_python)
-            with open(REJECTED_REPOS_FILE, "w", encoding="utf-8") as f:
-                json.dump(existing, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error writing to {REJECTED_REPOS_FILE}: {e}")
-    return filtered_by_python
+        aliases.append(f"r{index}: repository(owner: {json.dumps(owner)}, name: {json.dumps(repo_name)}) "
+                       f"{{ {LANGUAGES_GRAPHQL_FIELDS} }}")
+    query = "query {\n  " + "\n  ".join(aliases) + "\n}"
+    try:
+        with get_metrics().profiled("python_percentage"):
+            response = github_graphql(session, query, headers, limiter)
+        response.raise_for_status()
+        payload = response.json()
+        data = payload.get("data")
+        if data is None:
+            raise ValueError(payload.get("errors") or "response has no data")
+    except Exception as e:
+        print(f"GraphQL languages query failed for {len(repos)} repos ({e}). Falling back to REST...")
+        return [_fetch_languages(session, rest_limiter, repo, headers) for repo in repos]
+
+    # Errors are reported per alias, so one missing repo does not sink the batch
+    errors_by_alias = {}
+    for error in payload.get("errors") or []:
+        path = error.get("path") or []
+        if path:
+            errors_by_alias[path[0]] = error.get("message")
+
+    all_lang_data = []
+    for index, repo in enumerate(repos):
+        node = data.get(f"r{index}")
+        if not node or not node.get("languages"):
+            message = errors_by_alias.get(f"r{index}", "repository not found")
+            print(f"Error fetching languages for {repo['full_name']}: {message}")
+            all_lang_data.append(None)
+            continue
+        languages = node["languages"]
+        lang_data = {edge["node"]["name"]: edge["size"] for edge in languages.get("edges", [])}
+        # Keep the total identical to the REST endpoint even if languages were truncated
+        untracked = (languages.get("totalSize") or 0) - sum(lang_data.values())
+        if untracked > 0:
+            lang_data["(other)"] = untracked
+        all_lang_data.append(lang_data)
+    return all_lang_data
+
+
+def _save_rejected_repos(rejected_by_python):
+    try:
+        # Merge with the existing rejected repos, once each, like the SWE-Bench blacklist
+        combined_rejected = list(Load_repos(REJECTED_REPOS_FILE).union(rejected_by_python))
+        atomic_write_json(REJECTED_REPOS_FILE, combined_rejected)
+    except Exception as e:
+        print(f"Error writing to {REJECTED_REPOS_FILE}: {e}")
+
+
+def iter_python_percentage(repos, headers, max_workers=GITHUB_MAX_WORKERS, backend=LANGUAGES_BACKEND,
+                           registry=None):
+    """
+    Streaming form of Filterby_Python_percentage: consumes `repos` lazily and
+    yields each repo that passes as soon as its batch has been checked.
+    Rejected repos are recorded in `registry` after every batch, or appended to
+    REJECTED_REPOS_FILE when the stream ends if no registry is given.
+    """
+    if backend == "graphql" and "Authorization" not in headers:
+        print("Warning: The GraphQL languages backend requires a GitHub token. Using the REST backend instead.")
+        backend = "rest"
+
+    rejected_by_python = []
+    session = create_github_session(pool_size=max_workers)
+    limiter = GitHubRateLimiter()
+    graphql_limiter = GitHubRateLimiter()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Chunks keep the thread pool busy without waiting for the whole input
+            chunk_size = GITHUB_GRAPHQL_BATCH_SIZE * max_workers if backend == "graphql" else max_workers * 2
+            for chunk in batched(repos, chunk_size):
+                if backend == "graphql":
+                    batches = [chunk[i:i + GITHUB_GRAPHQL_BATCH_SIZE]
+                               for i in range(0, len(chunk), GITHUB_GRAPHQL_BATCH_SIZE)]
+                    all_lang_data = chain.from_iterable(
+                        executor.map(lambda batch: _fetch_languages_graphql(session, graphql_limiter, batch,
+                                                                            headers, limiter),
+                                     batches))
+                else:
+                    all_lang_data = executor.map(lambda repo: _fetch_languages(session, limiter, repo, headers),
+                                                 chunk)
+                with get_metrics().waiting("languages_workers"):
+                    all_lang_data = list(all_lang_data)
+                passed = []
+                for repo, lang_data in zip(chunk, all_lang_data):
+                    if lang_data is None:
+                        continue
+                    total_bytes = sum(lang_data.values())
+                    python_bytes = lang_data.get("Python", 0)
+                    python_percent = (python_bytes / total_bytes) * 100 if total_bytes > 0 else 0
+                    if python_percent >= PYTHON_PERCENTAGE_THRESHOLD:
+                        repo["python_percent"] = round(python_percent, 2)
+                        passed.append(repo)
+                    else:
+                        rejected_by_python.append(repo["html_url"])
+                if registry is not None and rejected_by_python:
+                    registry.record_verdicts((url, STATUS_REJECTED_PYTHON) for url in rejected_by_python)
+                    rejected_by_python = []
+                yield from passed
+    finally:
+        session.close()
+        if rejected_by_python:
+            _save_rejected_repos(rejected_by_python)
+
+
+# Filter by Python language percentage
+def Filterby_Python_percentage(cleaned_filtered_repos, headers, max_workers=GITHUB_MAX_WORKERS,
+                               backend=LANGUAGES_BACKEND, registry=None):
+    """
+    Keeps repos whose code is at least PYTHON_PERCENTAGE_THRESHOLD % Python.
+
+    Language breakdowns come from `backend`: "rest" queries the languages
+    endpoint once per repo, "graphql" batches GITHUB_GRAPHQL_BATCH_SIZE repos
+    into each query. Either way the calls run on a pool of `max_workers`
+    threads sharing one pooled session and one rate limiter. Results keep the
+    order of `cleaned_filtered_repos`.
+    """
+    if not cleaned_filtered_repos:
+        return []
+    return list(iter_python_percentage(cleaned_filtered_repos, headers, max_workers, backend, registry))
 
 
 def Load_repos(file_path):
@@ -77,11 +195,12 @@ def Load_repos(file_path):
     return owned_repos
 
 
-def cleaned_repos(merged_repos, results):
-    cleaned_filtered_repos = []
-    for repo_data in results.get('items', []):
+def iter_cleaned_repos(merged_repos, items):
+    # Yields the cleaned form of every item whose html_url is not in merged_repos
+    for repo_data in items:
         if repo_data.get('html_url') not in merged_repos:
             cleaned_repo_info = {
+                "id": repo_data.get('id'),
                 "full_name": repo_data.get('full_name'),
                 "html_url": repo_data.get('html_url'),
                 "stars": repo_data.get('stargazers_count'),
@@ -94,124 +213,271 @@ def cleaned_repos(merged_repos, results):
                 "updated_at": repo_data.get('updated_at'),
                 "pushed_at": repo_data.get('pushed_at'),
                 "license": repo_data.get('license', {}).get('name') if repo_data.get('license') else None,
+                # Kept for the cheap pre-filters in filters.py
+                "size": repo_data.get('size'),
+                "archived": repo_data.get('archived'),
+                "fork": repo_data.get('fork'),
+                "topics": repo_data.get('topics', []),
             }
-            cleaned_filtered_repos.append(cleaned_repo_info)
-    return cleaned_filtered_repos
+            yield cleaned_repo_info
+
 
-def create_session_with_retries():
+def cleaned_repos(merged_repos, results):
+    return list(iter_cleaned_repos(merged_repos, results.get('items', [])))
+
+def create_session_with_retries(pool_size=SWE_BENCH_MAX_IN_FLIGHT):
     session = requests.Session()
     retry_strategy = Retry(
         total=SWE_BENCH_MAX_RETRIES,
-        status_forcelist=[429, 500, 502, 503, 504], # Retry on these status codes
+        status_forcelist=[500, 502, 504], # Retry on these status codes; 429/503 go to the scheduler
         allowed_methods=["HEAD", "GET", "OPTIONS"],
-        backoff_factor=SWE_BENCH_BACKOFF_FACTOR
+        backoff_factor=SWE_BENCH_BACKOFF_FACTOR,
+        respect_retry_after_header=False # Otherwise urllib3 sleeps through Retry-After on its own
     )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
+    adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=pool_size, pool_maxsize=pool_size)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
     return session
 
-def filter_by_swe_bench_batches(repos_to_check, initial_swe_bench_headers):
+
+def _check_swe_bench(session, scheduler, repo_info, initial_swe_bench_headers, parse=True):
     """
-    Checks repositories for batch validity.
+    Fetches and parses the SWE-Bench page of one repo under `scheduler`.
+    Returns (status, batch_count, retry_after) where status is "passed",
+    "failed" or "throttled". With `parse=False` a fetched page is returned
+    unparsed instead, as ("fetched", content, None).
+    """
+    with get_metrics().profiled("swe_bench"):
+        status, content, retry_after = _fetch_swe_bench_page(session, scheduler, repo_info,
+                                                             initial_swe_bench_headers)
+        if status != "fetched" or not parse:
+            return status, content, retry_after
+        from swe_bench_parser import count_batches # bs4 and lxml are only loaded once a page needs parsing
+        with get_metrics().stage("swe_bench_parse"):
+            batch_count = count_batches(content)
+        return _batch_verdict(repo_info["full_name"], batch_count) + (None,)
+
+
+def _batch_verdict(full_name, batch_count):
+    # Returns (status, batch_count) for a parsed page
+    if batch_count:
+        print(f"  [SWE-BENCH PASSED] Found {batch_count} valid batch(es) for {full_name}.")
+        return "passed", batch_count
+    if batch_count == 0:
+        print(f"  [SWE-BENCH FAILED] Found <tbody> but no valid <tr> for {full_name}.")
+    else:
+        print(f"  [SWE-BENCH FAILED] No <tbody> structure for {full_name}.")
+    return "failed", 0
+
+
+def _fetch_swe_bench_page(session, scheduler, repo_info, initial_swe_bench_headers):
+    full_name = repo_info["full_name"]
+
+    # Rotate User-Agent for each request if desired, or set once per session
+    # The session itself doesn't rotate User-Agent per request automatically.
+    # So, we update the headers for each request if we want dynamic User-Agents.
+    current_headers = initial_swe_bench_headers.copy() # Start with base auth headers
+    current_headers.update({"User-Agent": get_random_user_agent()}) # Update/add random User-Agent
+
+    swe_bench_repo_name = full_name.replace("/", "__")
+    target_url = f"{SWE_BENCH_BASE_URL}{swe_bench_repo_name}{SWE_BENCH_FILTER_PARAMS}"
+
+    scheduler.acquire()
+    outcome, retry_after = OUTCOME_ERROR, None
+    response = None
+    started = time.perf_counter()
+    try:
+        print(f"Checking SWE-Bench for: {full_name} (Attempting...)")
+        print(f"  URL: {target_url}")
+        response = session.get(target_url, headers=current_headers, timeout=30) # Use session object
+        if response.status_code in (429, 503):
+            outcome, retry_after = OUTCOME_THROTTLED, parse_retry_after(response.headers.get("Retry-After"))
+            print(f"  [THROTTLED] HTTP {response.status_code} for {full_name}"
+                  f"{f', retry after {retry_after:.0f}s' if retry_after else ''}.")
+            return "throttled", 0, retry_after
+        if 400 <= response.status_code < 500:
+            # e.g. a 404 for a repo SWE-Bench Plus doesn't know: the repo fails, the rate stays
+            outcome = OUTCOME_CLIENT_ERROR
+        response.raise_for_status() # Will trigger retries for status_forcelist before raising here
+        outcome = OUTCOME_SUCCESS
+    except requests.exceptions.HTTPError as http_err:
+        print(f"  [HTTP ERROR] (final attempt) for {full_name}: {http_err}")
+        return "failed", 0, None
+    except requests.exceptions.RequestException as req_err: # Catches other errors like ConnectionError
+        print(f"  [REQUEST ERROR] (final attempt) for {full_name}: {req_err}")
+        return "failed", 0, None
+    finally:
+        get_metrics().observe_request("swe_bench", response, time.perf_counter() - started)
+        scheduler.release(outcome, retry_after)
+
+    # If we reach here, the request was successful
+    return "fetched", response.content, None
+
+
+def create_parse_pool(workers=SWE_BENCH_PARSE_WORKERS):
+    """
+    Returns a process pool for parsing SWE-Bench pages, or None to parse
+    them inline. Workers are spawned rather than forked, since forking a
+    process with running threads can leave locks held in the child.
+    """
+    if not workers:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def iter_swe_bench_batches(repos_to_check, initial_swe_bench_headers, registry=None, scheduler=None,
+                           parse_workers=SWE_BENCH_PARSE_WORKERS):
+    """
+    Checks repositories for batch validity as they arrive.
 
     Args:
-        repos_to_check (list): List of repository dictionaries.
-        swe_bench_auth_headers (dict): Authentication headers.
+        repos_to_check (iterable): Repository dictionaries, possibly a stream.
+        initial_swe_bench_headers (dict): Authentication headers.
+        registry (RepoRegistry): Where verdicts are recorded, in batches of
+            REGISTRY_FLUSH_EVERY. Without one, failures are merged into
+            SWE_BENCH_BLACKLIST_FILE when the stream ends.
+        scheduler (RateScheduler): Paces the requests; up to its
+            max_in_flight requests run at once. Defaults to the one chosen
+            by SWE_BENCH_SCHEDULER.
+        parse_workers (int): Processes the fetched pages are parsed in,
+            so the fetch threads go straight on to the next request. 0
+            parses each page on the thread that fetched it.
 
-    Returns:
-        list: Repositories that passed the SWE-Bench check.
+    Yields:
+        dict: Each repository that passed the SWE-Bench check, in the order
+        the checks complete.
     """
-    passed_repos = []
     failed_or_problematic_repo_urls = []
+    pending_verdicts = []
 
-    if not repos_to_check:
-        return []
-
-    print(f"\nChecking {len(repos_to_check)} repos against SWE-Bench Plus for batch validity...")
+    def record(repo, status):
+        if registry is None:
+            if status == STATUS_SWE_FAILED:
+                failed_or_problematic_repo_urls.append(repo)
+            return
+        pending_verdicts.append((repo, status))
+        if len(pending_verdicts) >= REGISTRY_FLUSH_EVERY:
+            registry.record_verdicts(pending_verdicts)
+            pending_verdicts.clear()
 
-    session = create_session_with_retries()
-    consecutive_requests_count = 0
+    print("\nChecking repos against SWE-Bench Plus for batch validity...")
 
-    for i, repo_info in enumerate(repos_to_check):
-        full_name = repo_info.get("full_name")
-        html_url = repo_info.get("html_url")
+    if scheduler is None:
+        scheduler = create_swe_bench_scheduler()
+    session = create_session_with_retries(pool_size=scheduler.max_in_flight)
+    executor = ThreadPoolExecutor(max_workers=scheduler.max_in_flight)
+    parse_pool = create_parse_pool(parse_workers)
+    if parse_pool is not None:
+        from swe_bench_parser import count_batches_timed
+    # Fetched pages waiting for a parser are held in memory; stop fetching past this many
+    max_parsing = 4 * parse_workers
+    repos_iter = iter(repos_to_check)
+    retry_queue = deque() # Repos that were throttled and should be tried again
+    throttle_counts = {}
+    in_flight = {}
+    parsing = {}
+    checked = 0
 
-        if not full_name or not html_url:
+    def next_repo():
+        if retry_queue:
+            return retry_queue.popleft()
+        while True:
+            repo_info = next(repos_iter, None)
+            if repo_info is None:
+                return None
+            if repo_info.get("full_name") and repo_info.get("html_url"):
+                return repo_info
             print(f"  Skipping repo due to missing full_name or html_url: {repo_info}")
-            if html_url:
-                failed_or_problematic_repo_urls.append(html_url)
-            continue
+            if repo_info.get("html_url"):
+                record(repo_info["html_url"], STATUS_SWE_FAILED)
 
-        # Rotate User-Agent for each request if desired, or set once per session
-        # The session itself doesn't rotate User-Agent per request automatically.
-        # So, we update the headers for each request if we want dynamic User-Agents.
-        current_headers = initial_swe_bench_headers.copy() # Start with base auth headers
-        current_headers.update({"User-Agent": get_random_user_agent()}) # Update/add random User-Agent
+    try:
+        exhausted = False
+        while True:
+            while (not exhausted and len(in_flight) < scheduler.max_in_flight
+                   and (parse_pool is None or len(parsing) < max_parsing)):
+                repo_info = next_repo()
+                if repo_info is None:
+                    exhausted = True
+                    break
+                future = executor.submit(_check_swe_bench, session, scheduler, repo_info, initial_swe_bench_headers,
+                                         parse_pool is None)
+                in_flight[future] = repo_info
+            if not in_flight and not parsing:
+                if retry_queue:
+                    exhausted = False
+                    continue
+                break
+            with get_metrics().waiting("swe_bench_checks"):
+                done, _ = wait(list(in_flight) + list(parsing), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in parsing:
+                    repo_info = parsing.pop(future)
+                    try:
+                        batch_count, seconds = future.result()
+                        get_metrics().record_stage("swe_bench_parse", seconds)
+                        status, batch_count = _batch_verdict(repo_info["full_name"], batch_count)
+                    except Exception as e:
+                        print(f"  [UNEXPECTED ERROR] parsing the page of {repo_info['full_name']}: {e}")
+                        status, batch_count = "failed", 0
+                else:
+                    repo_info = in_flight.pop(future)
+                    try:
+                        status, result, _ = future.result()
+                    except Exception as e:
+                        print(f"  [UNEXPECTED ERROR] processing {repo_info['full_name']}: {e}")
+                        status, result = "failed", 0
+                    if status == "fetched":
+                        # The verdict comes once a parser process is done with the page
+                        parsing[parse_pool.submit(count_batches_timed, result, SWE_BENCH_PARSER)] = repo_info
+                        continue
+                    batch_count = result
+                html_url = repo_info["html_url"]
+                if status == "throttled":
+                    throttle_counts[html_url] = throttle_counts.get(html_url, 0) + 1
+                    if throttle_counts[html_url] <= SWE_BENCH_MAX_THROTTLE_RETRIES:
+                        retry_queue.append(repo_info)
+                        exhausted = False
+                    else:
+                        # Being throttled says nothing about the repo; leave it for the next run
+                        print(f"  Giving up on {repo_info['full_name']} for this run after repeated throttling.")
+                    continue
+                checked += 1
+                if status == "passed":
+                    repo_info["swe_bench_batch_count"] = batch_count
+                    record(repo_info, STATUS_SWE_PASSED)
+                    yield repo_info
+                else:
+                    record(html_url, STATUS_SWE_FAILED)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if parse_pool is not None:
+            parse_pool.shutdown(wait=True, cancel_futures=True)
+        session.close()
+        print(f"SWE-Bench: checked {checked} repos, {scheduler.summary()}.")
+        if pending_verdicts:
+            registry.record_verdicts(pending_verdicts)
+        # Update the SWE_BENCH_BLACKLIST_FILE
+        if failed_or_problematic_repo_urls:
+            try:
+                existing_blacklist = Load_repos(SWE_BENCH_BLACKLIST_FILE)
+                combined_blacklist = list(existing_blacklist.union(set(failed_or_problematic_repo_urls)))
+                atomic_write_json(SWE_BENCH_BLACKLIST_FILE, combined_blacklist)
+            except Exception as e:
+                print(f"Error writing to {SWE_BENCH_BLACKLIST_FILE}: {e}")
 
-        swe_bench_repo_name = full_name.replace("/", "__")
-        target_url = f"{SWE_BENCH_BASE_URL}{swe_bench_repo_name}{SWE_BENCH_FILTER_PARAMS}"
 
-        print(f"({i+1}/{len(repos_to_check)}) Checking SWE-Bench for: {full_name} (Attempting...)")
-        print(f"  URL: {target_url}")
+def filter_by_swe_bench_batches(repos_to_check, initial_swe_bench_headers, registry=None, scheduler=None):
+    """
+    Checks repositories for batch validity.
 
-        try:
-            response = session.get(target_url, headers=current_headers, timeout=30) # Use session object
-            response.raise_for_status() # Will trigger retries for status_forcelist before raising here
-
-            # If we reach here, the request was successful
-            soup = BeautifulSoup(response.content, 'lxml')
-            tbody_tag = soup.find("tbody", class_="bg-white divide-y divide-gray-200")
-
-            if tbody_tag:
-                tr_tags = tbody_tag.find_all("tr", class_="hover:bg-gray-50 cursor-pointer")
-                if tr_tags:
-                    print(f"  [SWE-BENCH PASSED] Found {len(tr_tags)} valid batch(es) for {full_name}.")
-                    repo_info["swe_bench_batch_count"] = len(tr_tags)
-                    passed_repos.append(repo_info)
-                else:
-                    print(f"  [SWE-BENCH FAILED] Found <tbody> but no valid <tr> for {full_name}.")
-                    failed_or_problematic_repo_urls.append(html_url)
-            else:
-                print(f"  [SWE-BENCH FAILED] No <tbody> structure for {full_name}.")
-                failed_or_problematic_repo_urls.append(html_url)
-
-            consecutive_requests_count += 1
-
-        except requests.exceptions.HTTPError as http_err:
-            print(f"  [HTTP ERROR] (final attempt) for {full_name}: {http_err}")
-            failed_or_problematic_repo_urls.append(html_url)
-            consecutive_requests_count = 0 # Reset on error
-        except requests.exceptions.RequestException as req_err: # Catches other errors like ConnectionError
-            print(f"  [REQUEST ERROR] (final attempt) for {full_name}: {req_err}")
-            failed_or_problematic_repo_urls.append(html_url)
-            consecutive_requests_count = 0 # Reset on error
-        except Exception as e:
-            print(f"  [UNEXPECTED ERROR] processing {full_name}: {e}")
-            failed_or_problematic_repo_urls.append(html_url)
-            consecutive_requests_count = 0 # Reset on error
-
-        # Delays and long pause
-        if consecutive_requests_count >= SWE_BENCH_MAX_CONSECUTIVE_REQUESTS:
-            print(f"Reached {SWE_BENCH_MAX_CONSECUTIVE_REQUESTS} consecutive successful requests. Pausing for {SWE_BENCH_LONG_PAUSE_DURATION}s...")
-            time.sleep(SWE_BENCH_LONG_PAUSE_DURATION)
-            consecutive_requests_count = 0 # Reset counter
-        else:
-            # Apply random delay between requests
-            sleep_duration = random.uniform(SWE_BENCH_MIN_DELAY, SWE_BENCH_MAX_DELAY)
-            print(f"  Sleeping for {sleep_duration:.2f} seconds...")
-            if i < len(repos_to_check) - 1: # Don't sleep after the last item
-                 time.sleep(sleep_duration)
-
-
-    # Update the SWE_BENCH_BLACKLIST_FILE
-    if failed_or_problematic_repo_urls:
-        try:
-            existing_blacklist = Load_repos(SWE_BENCH_BLACKLIST_FILE)
-            combined_blacklist = list(existing_blacklist.union(set(failed_or_problematic_repo_urls)))
-            with open(SWE_BENCH_BLACKLIST_FILE, "w", encoding="utf-8") as f:
-                json.dump(combined_blacklist, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error writing to {SWE_BENCH_BLACKLIST_FILE}: {e}")
+    Args:
+        repos_to_check (list): List of repository dictionaries.
+        swe_bench_auth_headers (dict): Authentication headers.
 
-    return passed_repos
+    Returns:
+        list: Repositories that passed the SWE-Bench check.
+    """
+    if not repos_to_check:
+        return []
+    return list(iter_swe_bench_batches(repos_to_check, initial_swe_bench_headers, registry, scheduler))
@@ -0,0 +1,86 @@
+"""
+Load time, memory and lookup speed of the known-repo check at growing
+registry sizes: an in-memory set of every url (what the pipeline used to
+build at start-up) against membership.MembershipIndex.
+
+Registries are generated in a scratch directory, so nothing real is touched.
+
+    python benchmarks/bench_membership.py [--sizes 10000 100000 1000000] [--lookups 20000]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from membership import MembershipIndex
+from registry import RepoRegistry, STATUS_SWE_FAILED
+
+
+def fill_registry(registry, size, batch=50_000):
+    for start in range(0, size, batch):
+        registry.record_verdicts((f"https://github.com/org-{i % 5000}/repo-{i}", STATUS_SWE_FAILED)
+                                 for i in range(start, min(size, start + batch)))
+
+
+def _loaded(index):
+    # The index opens lazily; load it here so it counts as load time
+    len(index)
+    return index
+
+
+def measure(load, lookups):
+    # Returns (load seconds, peak traced KiB while loading and looking up, µs per lookup)
+    tracemalloc.start()
+    started = time.perf_counter()
+    known = load()
+    loaded = time.perf_counter() - started
+    started = time.perf_counter()
+    hits = sum(url in known for url in lookups)
+    per_lookup = (time.perf_counter() - started) / len(lookups)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return loaded, peak / 1024, per_lookup * 1e6, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--lookups", type=int, default=20_000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="repos_finder_membership_")
+    cwd = os.getcwd()
+    os.chdir(workdir) # RepoRegistry imports the owned repos list from the working directory
+    print(f"{'repos':>9}  {'method':<14} {'load ms':>9} {'peak KiB':>10} {'µs/lookup':>10} {'hits':>6}")
+    try:
+        for size in args.sizes:
+            db_path = os.path.join(workdir, f"registry_{size}.db")
+            index_path = db_path + ".idx"
+            registry = RepoRegistry(db_path)
+            fill_registry(registry, size)
+            # Half the lookups are known repos, half are not
+            lookups = [f"https://github.com/org-{i % 5000}/repo-{i}"
+                       for i in random.sample(range(size * 2), args.lookups)]
+
+            methods = [
+                ("set of urls", lambda: set(registry.urls_since(None))),
+                ("index (build)", lambda: _loaded(MembershipIndex(registry, index_path))),
+                ("index (warm)", lambda: _loaded(MembershipIndex(registry, index_path))),
+            ]
+            for name, load in methods:
+                loaded, peak, per_lookup, hits = measure(load, lookups)
+                print(f"{size:>9}  {name:<14} {loaded * 1000:>9.1f} {peak:>10.0f} {per_lookup:>10.2f} {hits:>6}")
+            registry.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Inline parsing against a pool of parser processes (SWE_BENCH_PARSE_WORKERS)
+for SWE-Bench pages arriving from concurrent fetch threads.
+
+Fetch threads sleep for --latency seconds per page, standing in for the
+request, then either parse the page themselves (inline) or hand the bytes to
+create_parse_pool(). A heartbeat thread meanwhile wakes up every millisecond;
+how late it wakes up is how long a thread waiting on the network would have
+been held up by parsing holding the GIL. Reports pages/second and heartbeat
+lateness (p50, p99, max) for each mode.
+
+    python benchmarks/bench_parse_offload.py [PAGES_DIR] [--pages 300] [--fetchers 8] [--workers 0 1 2 4]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_swe_bench_parser import DEFAULT_PAGES_DIR, load_pages
+from FilterRepo import create_parse_pool
+from swe_bench_parser import count_batches, count_batches_timed
+
+HEARTBEAT_INTERVAL = 0.001
+
+
+def heartbeat(stop, lateness):
+    while not stop.is_set():
+        expected = time.perf_counter() + HEARTBEAT_INTERVAL
+        time.sleep(HEARTBEAT_INTERVAL)
+        lateness.append(time.perf_counter() - expected)
+
+
+def run_mode(pages, count, fetchers, latency, workers):
+    parse_pool = create_parse_pool(workers)
+    if parse_pool is not None:
+        # Start the workers before timing, as the pipeline pays this once per run
+        list(parse_pool.map(count_batches_timed, pages))
+
+    def fetch_and_parse(index):
+        time.sleep(latency)
+        content = pages[index % len(pages)]
+        if parse_pool is None:
+            return count_batches(content)
+        return parse_pool.submit(count_batches_timed, content)
+
+    stop, lateness = threading.Event(), []
+    ticker = threading.Thread(target=heartbeat, args=(stop, lateness), daemon=True)
+    ticker.start()
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=fetchers) as executor:
+            results = list(executor.map(fetch_and_parse, range(count)))
+        if parse_pool is not None:
+            results = [future.result()[0] for future in results]
+    finally:
+        elapsed = time.perf_counter() - started
+        stop.set()
+        ticker.join()
+        if parse_pool is not None:
+            parse_pool.shutdown()
+    lateness.sort()
+    return count / elapsed, lateness, results
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pages_dir", nargs="?", default=DEFAULT_PAGES_DIR)
+    parser.add_argument("--pages", type=int, default=300, help="pages fetched per mode")
+    parser.add_argument("--fetchers", type=int, default=8, help="concurrent fetch threads")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds each simulated fetch takes")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4],
+                        help="parser processes to compare; 0 parses inline")
+    args = parser.parse_args()
+
+    pages = list(load_pages(args.pages_dir).values())
+    if not pages:
+        print(f"No .html pages found in {args.pages_dir}")
+        return 1
+    print(f"{args.pages} pages, {args.fetchers} fetch threads, {args.latency * 1000:.0f} ms per fetch, "
+          f"{os.cpu_count()} CPUs\n")
+    print(f"{'mode':<12} {'pages/s':>9} {'stall p50':>10} {'stall p99':>10} {'stall max':>10}")
+    expected = None
+    for workers in args.workers:
+        rate, lateness, results = run_mode(pages, args.pages, args.fetchers, args.latency, workers)
+        if expected is None:
+            expected = results
+        elif results != expected:
+            print(f"MISMATCH: {workers} workers counted different batches than inline parsing")
+            return 1
+        mode = f"{workers} workers" if workers else "inline"
+        print(f"{mode:<12} {rate:>9.1f} " + " ".join(f"{percentile(lateness, share) * 1000:>8.2f}ms"
+                                                  for share in (0.5, 0.99, 1.0)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
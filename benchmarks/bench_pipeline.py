@@ -0,0 +1,130 @@
+"""
+End-to-end throughput benchmark of run_filter_pipeline against the local stub
+server (benchmarks/stub_server.py), with no live services or credentials.
+
+Each run executes the full pipeline in a scratch directory and reports wall
+time, requests and requests/second per endpoint, peak RSS and the requests
+avoided through the HTTP cache. Later runs reuse the scratch directory, so
+--runs 2 shows the effect of the registry and the warm cache.
+
+    python benchmarks/bench_pipeline.py [--repos 3000] [--latency 0.05] [--runs 2] [--json report.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_server import add_arguments, load_state, start_in_thread
+
+
+def configure_pipeline(base_url, args):
+    # Must run before any pipeline module is imported: they read config at import time
+    os.environ["GITHUB_API_BASE_URL"] = base_url
+    os.environ["SWE_BENCH_BASE_URL"] = f"{base_url}/swe/"
+    import config
+    config.SWE_BENCH_REQUESTS_PER_MINUTE = args.pipeline_swe_per_minute
+    config.SWE_BENCH_MAX_IN_FLIGHT = args.in_flight
+    config.SWE_BENCH_BURST = args.in_flight
+    config.GITHUB_SEARCH_REQUESTS_PER_MINUTE = args.search_per_minute
+    config.LANGUAGES_BACKEND = args.languages_backend
+    config.SWE_BENCH_PARSE_WORKERS = args.parse_workers
+
+
+def run_once(state, log_path):
+    import run
+    from http_cache import get_default_cache
+
+    cache = get_default_cache()
+    cache.hits = cache.revalidated = cache.misses = 0
+    state.counts.clear()
+    state.first_seen.clear()
+    state.last_seen.clear()
+
+    start = time.perf_counter()
+    with open(log_path, "a", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        run.run_filter_pipeline()
+    wall = time.perf_counter() - start
+
+    endpoints = state.summary()
+    served = sum(entry["requests"] for entry in endpoints.values())
+    not_modified = sum(entry["by_status"].get("304", 0) for entry in endpoints.values())
+    return {
+        "wall_seconds": round(wall, 3),
+        "requests": served,
+        "endpoints": endpoints,
+        "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "requests_avoided": {
+            "cache_fresh_hits": cache.hits, # never sent
+            "not_modified": not_modified, # sent, but free for the rate limit
+        },
+    }
+
+
+def print_report(index, report):
+    print(f"\nRun {index}: {report['wall_seconds']:.2f}s wall, {report['requests']} requests, "
+          f"peak RSS {report['peak_rss_kib'] / 1024:.1f} MiB")
+    print(f"  {'endpoint':<12} {'requests':>9} {'req/s':>8}  statuses")
+    for endpoint, entry in report["endpoints"].items():
+        rate = entry["requests_per_second"]
+        rate = f"{rate:.1f}" if rate is not None else "-"
+        statuses = ", ".join(f"{status}: {count}" for status, count in entry["by_status"].items())
+        print(f"  {endpoint:<12} {entry['requests']:>9} {rate:>8}  {statuses}")
+    avoided = report["requests_avoided"]
+    print(f"  avoided: {avoided['cache_fresh_hits']} requests served from cache, "
+          f"{avoided['not_modified']} answered 304 (free for the rate limit)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--pipeline-swe-per-minute", type=float, default=6000,
+                        help="SWE_BENCH_REQUESTS_PER_MINUTE used by the pipeline")
+    parser.add_argument("--in-flight", type=int, default=4, help="SWE_BENCH_MAX_IN_FLIGHT used by the pipeline")
+    parser.add_argument("--languages-backend", choices=("rest", "graphql"), default="rest")
+    parser.add_argument("--parse-workers", type=int, default=0, help="SWE_BENCH_PARSE_WORKERS used by the pipeline")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--keep-workdir", action="store_true")
+    args = parser.parse_args()
+
+    state = load_state(args)
+    server, base_url = start_in_thread(state)
+    workdir = tempfile.mkdtemp(prefix="repos_finder_bench_")
+    with open(os.path.join(workdir, "repos_list.json"), "w", encoding="utf-8") as f:
+        f.write("[]")
+    json_path = os.path.abspath(args.json) if args.json else None
+    os.chdir(workdir)
+    if args.languages_backend == "graphql":
+        os.environ.setdefault("GITHUB_TOKEN", "stub-token") # The GraphQL backend needs a token
+    configure_pipeline(base_url, args)
+
+    print(f"Stub server at {base_url} with {len(state.repos)} repos; working in {workdir}")
+    reports = []
+    try:
+        for index in range(1, args.runs + 1):
+            report = run_once(state, os.path.join(workdir, "pipeline.log"))
+            reports.append(report)
+            print_report(index, report)
+    finally:
+        server.shutdown()
+        if not args.keep_workdir:
+            os.chdir(REPO_ROOT)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"runs": reports, "arguments": vars(args)}, f, indent=2)
+        print(f"\nReport written to {json_path}")
+
+
+if __name__ == "__main__":
+    main()
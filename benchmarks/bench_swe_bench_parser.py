@@ -0,0 +1,89 @@
+"""
+Micro-benchmark of the SWE-Bench batch extractors in swe_bench_parser.py.
+
+Runs every extractor over the saved pages in a directory (by default
+benchmarks/fixtures/swe_bench), checks that they all report the same batch
+count as the full BeautifulSoup parse, and prints time and peak Python memory
+per page. Save real pages into the directory (or pass another one) to
+benchmark against production markup.
+
+    python benchmarks/bench_swe_bench_parser.py [PAGES_DIR] [--repeat N]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swe_bench_parser import PARSERS
+
+DEFAULT_PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "swe_bench")
+
+
+def load_pages(pages_dir):
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(pages_dir, "*.html"))):
+        with open(path, "rb") as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+
+def check_agreement(pages):
+    # Every extractor must report exactly what the full parse reports
+    mismatches = 0
+    for name, content in pages.items():
+        expected = PARSERS["bs4"](content)
+        for parser_name, parser in PARSERS.items():
+            got = parser(content)
+            if got != expected:
+                mismatches += 1
+                print(f"MISMATCH {name}: {parser_name} -> {got}, bs4 -> {expected}")
+    return mismatches
+
+
+def bench(parser, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for content in pages.values():
+            parser(content)
+    per_page = (time.perf_counter() - start) / (repeat * len(pages))
+
+    peak = 0
+    for content in pages.values():
+        tracemalloc.start()
+        parser(content)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return per_page, peak
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("pages_dir", nargs="?", default=DEFAULT_PAGES_DIR)
+    arg_parser.add_argument("--repeat", type=int, default=50)
+    args = arg_parser.parse_args()
+
+    pages = load_pages(args.pages_dir)
+    if not pages:
+        print(f"No .html pages found in {args.pages_dir}")
+        return 1
+    total_kb = sum(len(content) for content in pages.values()) / 1024
+    print(f"{len(pages)} pages ({total_kb:.0f} KiB) from {args.pages_dir}, {args.repeat} rounds\n")
+
+    if check_agreement(pages):
+        return 1
+
+    baseline = None
+    print(f"{'parser':<10} {'ms/page':>9} {'speedup':>8} {'peak KiB':>9}")
+    for parser_name, parser in PARSERS.items():
+        per_page, peak = bench(parser, pages, args.repeat)
+        baseline = baseline or per_page
+        print(f"{parser_name:<10} {per_page * 1000:>9.2f} {baseline / per_page:>7.1f}x {peak / 1024:>9.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
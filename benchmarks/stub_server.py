@@ -0,0 +1,348 @@
+"""
+Local stand-in for the GitHub API and SWE-Bench Plus, for offline benchmarks.
+
+Serves:
+    GET  /search/repositories     pushed:/stars: range filtering, the
+                                  1000-result cap and a per-minute search budget
+    GET  /repos/{owner}/{repo}/languages
+    POST /graphql                 aliased repository { languages } queries
+    GET  /swe/{owner}__{repo}     SWE-Bench repo pages from fixtures/swe_bench, or
+                                  404 for unknown repos and every
+                                  --swe-missing-every'th known one
+
+Repos come from a recorded search payload (--repos-file, a JSON list of search
+`items`, optionally with a "languages" dict per item) or are generated
+deterministically. GitHub responses carry X-RateLimit-* headers and ETags;
+exhausted budgets answer 403 (GitHub) or 429 with Retry-After (SWE-Bench).
+
+Point the pipeline at it with:
+    GITHUB_API_BASE_URL=http://127.0.0.1:PORT SWE_BENCH_BASE_URL=http://127.0.0.1:PORT/swe/
+
+    python benchmarks/stub_server.py [--port 8765] [--repos 3000] [--latency 0.05]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SEARCH_RESULT_CAP = 1000
+
+
+def generate_repos(count, seed_date=None):
+    """
+    Deterministic fake search items: pushes spread over the last 600 days,
+    star counts from 501 up, a third of them mostly non-Python.
+    """
+    seed_date = seed_date or datetime.now(timezone.utc).date()
+    repos = []
+    for i in range(count):
+        python_bytes = 10_000 if i % 3 else 1_000
+        repos.append({
+            "id": 100_000 + i,
+            "full_name": f"stub-org-{i % 50}/repo-{i}",
+            "html_url": f"https://github.com/stub-org-{i % 50}/repo-{i}",
+            "stargazers_count": 501 + (i * 37) % 40_000,
+            "forks_count": i % 300,
+            "watchers_count": 501 + (i * 37) % 40_000,
+            "open_issues_count": i % 90,
+            "language": "Python",
+            "description": f"Stub repository {i}",
+            "created_at": "2020-01-01T00:00:00Z",
+            "updated_at": f"{seed_date - timedelta(days=i % 600)}T12:00:00Z",
+            "pushed_at": f"{seed_date - timedelta(days=i % 600)}T12:00:00Z",
+            "license": {"name": "MIT License"},
+            "size": 500 + (i * 13) % 50_000,
+            "archived": i % 41 == 0,
+            "fork": i % 53 == 0,
+            "topics": ["python"],
+            "languages": {"Python": python_bytes, "Shell": 2_000},
+        })
+    return repos
+
+
+class StubState:
+    """Configuration, data and counters shared by all request handlers."""
+
+    def __init__(self, repos, latency=0.0, swe_latency=None, core_limit=5000, search_per_minute=30,
+                 swe_per_minute=0, swe_missing_every=0, result_cap=SEARCH_RESULT_CAP):
+        self.repos = sorted(repos, key=lambda repo: -repo.get("stargazers_count", 0))
+        self.by_full_name = {repo["full_name"]: repo for repo in self.repos}
+        self.latency = latency
+        self.swe_latency = latency if swe_latency is None else swe_latency
+        self.core_limit = core_limit
+        self.search_per_minute = search_per_minute
+        self.swe_per_minute = swe_per_minute # 0 disables SWE-Bench throttling
+        self.swe_missing_every = swe_missing_every # 0: SWE-Bench knows every generated repo
+        self.result_cap = result_cap
+        self.counts = Counter() # (endpoint, status) -> requests
+        self.first_seen = {}
+        self.last_seen = {}
+        self._core_used = 0
+        self._core_reset = time.time() + 3600
+        self._search_window = []
+        self._swe_window = []
+        self._lock = threading.Lock()
+        self.pages = {}
+        for name in ("repo_with_batches", "repo_with_empty_table", "repo_without_batches"):
+            with open(os.path.join(FIXTURES_DIR, "swe_bench", f"{name}.html"), "rb") as f:
+                self.pages[name] = f.read()
+
+    def record(self, endpoint, status):
+        now = time.time()
+        with self._lock:
+            self.counts[(endpoint, status)] += 1
+            self.first_seen.setdefault(endpoint, now)
+            self.last_seen[endpoint] = now
+
+    def take_core(self):
+        # Returns (allowed, remaining, reset) for the hourly core budget
+        with self._lock:
+            if time.time() >= self._core_reset:
+                self._core_used, self._core_reset = 0, time.time() + 3600
+            if self._core_used >= self.core_limit:
+                return False, 0, int(self._core_reset)
+            self._core_used += 1
+            return True, self.core_limit - self._core_used, int(self._core_reset)
+
+    def take_window(self, window, per_minute):
+        # Sliding one-minute budget; returns (allowed, remaining, seconds until a slot frees up)
+        with self._lock:
+            now = time.time()
+            window[:] = [t for t in window if now - t < 60]
+            if len(window) >= per_minute:
+                return False, 0, 60 - (now - window[0])
+            window.append(now)
+            return True, per_minute - len(window), 60 - (now - window[0])
+
+    def summary(self):
+        endpoints = {}
+        for (endpoint, status), count in sorted(self.counts.items()):
+            entry = endpoints.setdefault(endpoint, {"requests": 0, "by_status": {}})
+            entry["requests"] += count
+            entry["by_status"][str(status)] = count
+        for endpoint, entry in endpoints.items():
+            active = self.last_seen[endpoint] - self.first_seen[endpoint]
+            entry["active_seconds"] = round(active, 3)
+            entry["requests_per_second"] = round(entry["requests"] / active, 2) if active > 0 else None
+        return endpoints
+
+
+def parse_range(query, field, parse, low, high):
+    # Inclusive (low, high) bounds of a `field:` qualifier as GitHub search reads it.
+    # Kept independent of pagination.py so the stub does not test the code against itself.
+    match = re.search(rf"(?:^|\s){field}:(\S+)", query)
+    if not match:
+        return low, high
+    value = match.group(1)
+    if ".." in value:
+        start, end = value.split("..", 1)
+        return (low if start == "*" else parse(start)), (high if end == "*" else parse(end))
+    for prefix in (">=", "<=", ">", "<"):
+        if value.startswith(prefix):
+            bound = parse(value[len(prefix):])
+            step = timedelta(days=1) if isinstance(bound, date) else 1
+            return {">=": (bound, high), "<=": (low, bound),
+                    ">": (bound + step, high), "<": (low, bound - step)}[prefix]
+    bound = parse(value)
+    return bound, bound
+
+
+def search(state, query):
+    pushed_low, pushed_high = parse_range(query, "pushed", date.fromisoformat, date.min, date.max)
+    stars_low, stars_high = parse_range(query, "stars", int, 0, 10 ** 9)
+    results = []
+    for repo in state.repos:
+        pushed = date.fromisoformat(repo["pushed_at"][:10])
+        if pushed_low <= pushed <= pushed_high and stars_low <= repo["stargazers_count"] <= stars_high:
+            results.append(repo)
+    return results
+
+
+def public_item(repo):
+    return {key: value for key, value in repo.items() if key != "languages"}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None # Set by make_server
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, endpoint, status, body=b"", content_type="application/json", headers=None):
+        self.state.record(endpoint, status)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        if body or status != 304:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _send_json(self, endpoint, payload, rate_headers, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        headers = {**rate_headers, "ETag": etag}
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            # Conditional hit: free for the client's rate limit
+            self._send(endpoint, 304, headers=headers)
+        else:
+            self._send(endpoint, status, body, headers=headers)
+
+    def _github_budget(self, endpoint, search_budget=False):
+        if search_budget:
+            allowed, remaining, reset_in = self.state.take_window(self.state._search_window,
+                                                                  self.state.search_per_minute)
+            reset = int(time.time() + reset_in) + 1
+        else:
+            allowed, remaining, reset = self.state.take_core()
+        limit = self.state.search_per_minute if search_budget else self.state.core_limit
+        headers = {"X-RateLimit-Limit": limit, "X-RateLimit-Remaining": remaining, "X-RateLimit-Reset": reset,
+                   "X-RateLimit-Resource": "search" if search_budget else "core"}
+        if not allowed:
+            body = json.dumps({"message": "API rate limit exceeded"}).encode("utf-8")
+            self._send(endpoint, 403, body, headers=headers)
+        return allowed, headers
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/search/repositories":
+            time.sleep(self.state.latency)
+            allowed, headers = self._github_budget("search", search_budget=True)
+            if not allowed:
+                return
+            params = parse_qs(url.query)
+            per_page = min(int(params.get("per_page", ["30"])[0]), 100)
+            page = int(params.get("page", ["1"])[0])
+            if page * per_page > self.state.result_cap:
+                body = json.dumps({"message": "Only the first 1000 search results are available"}).encode("utf-8")
+                return self._send("search", 422, body, headers=headers)
+            results = search(self.state, params.get("q", [""])[0])
+            items = [public_item(repo) for repo in results[(page - 1) * per_page:page * per_page]]
+            return self._send_json("search", {"total_count": len(results), "incomplete_results": False,
+                                              "items": items}, headers)
+
+        match = re.fullmatch(r"/repos/([^/]+/[^/]+)/languages", url.path)
+        if match:
+            time.sleep(self.state.latency)
+            allowed, headers = self._github_budget("languages")
+            if not allowed:
+                return
+            repo = self.state.by_full_name.get(match.group(1))
+            if repo is None:
+                return self._send("languages", 404, b'{"message": "Not Found"}', headers=headers)
+            return self._send_json("languages", repo.get("languages", {}), headers)
+
+        if url.path.startswith("/swe/"):
+            time.sleep(self.state.swe_latency)
+            if self.state.swe_per_minute:
+                allowed, _, retry_in = self.state.take_window(self.state._swe_window, self.state.swe_per_minute)
+                if not allowed:
+                    return self._send("swe_bench", 429, b"Too Many Requests", "text/plain",
+                                      {"Retry-After": max(1, int(retry_in))})
+            full_name = url.path[len("/swe/"):].replace("__", "/", 1)
+            repo = self.state.by_full_name.get(full_name)
+            missing_every = self.state.swe_missing_every
+            if repo is None or (missing_every and repo["id"] % missing_every == 0):
+                return self._send("swe_bench", 404, b"Not Found", "text/plain")
+            page = ("repo_with_batches", "repo_with_batches", "repo_with_empty_table",
+                    "repo_without_batches")[repo["id"] % 4]
+            return self._send("swe_bench", 200, self.state.pages[page], "text/html; charset=utf-8")
+
+        self._send("other", 404, b'{"message": "Not Found"}')
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/graphql":
+            return self._send("other", 404, b'{"message": "Not Found"}')
+        time.sleep(self.state.latency)
+        length = int(self.headers.get("Content-Length", 0))
+        query = json.loads(self.rfile.read(length) or b"{}").get("query", "")
+        allowed, headers = self._github_budget("graphql")
+        if not allowed:
+            return
+        data, errors = {}, []
+        for alias, owner, name in re.findall(r'(\w+): repository\(owner: "([^"]*)", name: "([^"]*)"\)', query):
+            repo = self.state.by_full_name.get(f"{owner}/{name}")
+            if repo is None:
+                data[alias] = None
+                errors.append({"type": "NOT_FOUND", "path": [alias],
+                               "message": f"Could not resolve to a Repository with the name '{owner}/{name}'."})
+                continue
+            languages = sorted(repo.get("languages", {}).items(), key=lambda item: -item[1])
+            data[alias] = {"languages": {"totalSize": sum(size for _, size in languages),
+                                         "edges": [{"size": size, "node": {"name": lang}}
+                                                   for lang, size in languages]}}
+        payload = {"data": data}
+        if errors:
+            payload["errors"] = errors
+        self._send("graphql", 200, json.dumps(payload).encode("utf-8"), headers=headers)
+
+
+def make_server(state, host="127.0.0.1", port=0):
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(state, host="127.0.0.1", port=0):
+    # Starts the stub on a daemon thread; returns (server, base_url)
+    server = make_server(state, host, port)
+    threading.Thread(target=server.serve_forever, name="stub-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def load_state(args):
+    if args.repos_file:
+        with open(args.repos_file, "r", encoding="utf-8") as f:
+            repos = json.load(f)
+    else:
+        repos = generate_repos(args.repos)
+    return StubState(repos, latency=args.latency, swe_latency=args.swe_latency, core_limit=args.core_limit,
+                     search_per_minute=args.search_per_minute, swe_per_minute=args.swe_per_minute,
+                     swe_missing_every=args.swe_missing_every)
+
+
+def add_arguments(parser):
+    parser.add_argument("--repos", type=int, default=3000, help="number of generated repos")
+    parser.add_argument("--repos-file", help="recorded search items (JSON list) to serve instead")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every GitHub response")
+    parser.add_argument("--swe-latency", type=float, default=None, help="seconds added to SWE-Bench pages")
+    parser.add_argument("--core-limit", type=int, default=5000, help="hourly GitHub core budget")
+    parser.add_argument("--search-per-minute", type=int, default=30, help="GitHub search budget per minute")
+    parser.add_argument("--swe-per-minute", type=int, default=0,
+                        help="SWE-Bench requests per minute before 429s (0: unlimited)")
+    parser.add_argument("--swe-missing-every", type=int, default=10,
+                        help="answer 404 for every Nth repo, as SWE-Bench does for repos it doesn't know (0: none)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local GitHub / SWE-Bench stand-in server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = make_server(load_state(args), args.host, args.port)
+    base_url = f"http://{args.host}:{server.server_address[1]}"
+    print(f"Serving on {base_url}")
+    print(f"  GITHUB_API_BASE_URL={base_url} SWE_BENCH_BASE_URL={base_url}/swe/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.RequestHandlerClass.state.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,12 +5,130 @@ OWNED_REPOS_FILE = "repos_list.json"
 FILTERED_REPOS_FILE = "filtered_repos.json"
 REJECTED_REPOS_FILE = "rejected_repos.json"
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+# Both base URLs can be pointed at benchmarks/stub_server.py for offline runs
+GITHUB_API_BASE_URL = os.getenv("GITHUB_API_BASE_URL", "https://api.github.com").rstrip("/")
+
+# Concurrency and rate-limit handling for GitHub API lookups
+GITHUB_MAX_WORKERS = 8
+GITHUB_REQUEST_TIMEOUT = 30
+GITHUB_MAX_RETRIES = 3
+GITHUB_BACKOFF_FACTOR = 0.5
+# Stop issuing requests once this many calls are left in the hourly budget
+GITHUB_RATE_LIMIT_RESERVE = 50
+
+# Search API: GitHub allows 30 search requests per minute (10 unauthenticated)
+# and returns at most 1000 results per query. Sharded search splits the query
+# into adjacent ranges of GITHUB_SEARCH_SHARD_FIELD ("pushed" or "stars") and
+# bisects every range that still matches more than GITHUB_SEARCH_MAX_RESULTS.
+GITHUB_SEARCH_SHARDED = True
+GITHUB_SEARCH_SHARD_FIELD = "pushed"
+GITHUB_SEARCH_REQUESTS_PER_MINUTE = 30
+GITHUB_SEARCH_MAX_RESULTS = 1000
+GITHUB_SEARCH_PER_PAGE = 100
+GITHUB_SEARCH_SHARD_WORKERS = 4
+# Queries searched by each run, concurrently under one search rate limiter. A
+# repo matched by several queries is cleaned and checked once. Add star bands
+# or topics, e.g. 'language:Python stars:200..500 pushed:>2024-11-01' or
+# 'language:Python topic:django stars:>100'.
+GITHUB_SEARCH_QUERIES = [
+    'language:Python stars:>500 pushed:>2024-11-01',
+]
+
+# Streaming pipeline: maximum number of items buffered between two stages
+PIPELINE_BUFFER_SIZE = 200
+# Write SWE-Bench verdicts to the registry in batches of this size. 1 commits
+# every verdict as soon as it is known, so an interrupted run loses no work.
+REGISTRY_FLUSH_EVERY = 1
+
+# On-disk cache of GitHub GET responses, revalidated with ETag / Last-Modified.
+# Set REPOS_FINDER_NO_CACHE=1 to bypass it for a run.
+HTTP_CACHE_DIR = ".http_cache"
+HTTP_CACHE_TTL = 3600 # Seconds an entry is served without revalidation
+HTTP_CACHE_MAX_BYTES = 200 * 1024 * 1024
+HTTP_CACHE_ENABLED = not os.getenv("REPOS_FINDER_NO_CACHE")
+
+# Minimum share of Python code (in %) for a repo to pass the language filter
+PYTHON_PERCENTAGE_THRESHOLD = 75
+ENABLE_PYTHON_PERCENTAGE_FILTER = True
+# Where language breakdowns come from: "rest" (one call per repo) or
+# "graphql" (GITHUB_GRAPHQL_BATCH_SIZE repos per call, requires GITHUB_TOKEN)
+LANGUAGES_BACKEND = "rest"
+GITHUB_GRAPHQL_BATCH_SIZE = 50
+
+# Cheap pre-filters on the search metadata, run before any API call (see filters.py).
+# A repo missing a field (e.g. queued by an older run) is not rejected for it.
+# Only archived repos are dropped by default; the others narrow the candidates
+# and are opt-in. Pre-filter rejects are evaluated again whenever these change.
+PREFILTER_EXCLUDE_ARCHIVED = True
+PREFILTER_EXCLUDE_FORKS = False
+# Repo size bounds in KB as reported by the search API (None disables a bound), e.g. a minimum of 50
+PREFILTER_MIN_SIZE_KB = None
+PREFILTER_MAX_SIZE_KB = None
+# GitHub's primary language must be one of these (empty disables the filter), e.g. ["Python"]
+PREFILTER_LANGUAGES = []
+# SWE-Bench tasks come from issues; 0 disables the filter
+PREFILTER_MIN_OPEN_ISSUES = 0
+# Repos tagged with any of these topics are dropped (empty disables the filter), e.g. lists and
+# teaching material: ["awesome", "awesome-list", "tutorial", "course", "cheatsheet", "interview",
+# "interview-questions", "books"]
+PREFILTER_EXCLUDED_TOPICS = []
+
+# Expected cost of each filter in seconds per repo, used to order the filter
+# chain. The SWE-Bench cost follows from its request rate.
+FILTER_COST_LOCAL = 0.00001
+FILTER_COST_PYTHON_PERCENTAGE = 0.5
+# Prior pass rates, refined with the pass counts of earlier runs. The prior
+# weighs as much as this many observed repos.
+FILTER_PRIOR_SELECTIVITY = {"local": 0.95, "python_percentage": 0.6, "swe_bench": 0.5}
+FILTER_PRIOR_WEIGHT = 20
 
 SWE_BENCH_GREEN_LIST_FILE = "swe_bench_passed_repos.json"
+# The green list as NDJSON, one repo per line, updated incrementally at the end
+# of each run. Its order (latest push, then most stars) is kept in a binary
+# index next to it; read it in that order with green_list.GreenList.
+SWE_BENCH_GREEN_LIST_NDJSON = "swe_bench_passed_repos.ndjson"
 SWE_BENCH_BLACKLIST_FILE = "swe_bench_failed_repos.json"
 
+# SQLite registry holding every repo and its verdict. The JSON list files above
+# are imported into it once and exported from it on demand.
+REGISTRY_DB_FILE = "repos_registry.db"
+# Also regenerate the legacy JSON files from the registry at the end of each
+# run: the green list (SWE_BENCH_GREEN_LIST_FILE and its copy
+# FILTERED_REPOS_FILE), REJECTED_REPOS_FILE and SWE_BENCH_BLACKLIST_FILE. Off
+# by default: the export rewrites every list. `run.py --export-json` and
+# `run.py merge --export-json` do it once.
+EXPORT_GREEN_LIST_JSON = bool(os.getenv("REPOS_FINDER_EXPORT_JSON"))
+# Sorted, memory-mapped file of repo key hashes used to skip known repos in the
+# search results (see membership.py). Rebuilt from the registry when missing.
+MEMBERSHIP_INDEX_FILE = "repos_registry.db.idx"
+# Repos added since the index file was written are held in memory; past this
+# many, the file is rewritten with them merged in
+MEMBERSHIP_INDEX_MAX_OVERLAY = 50_000
+# Days after which a verdict expires and the repo may be checked again (None:
+# never). Pre-filter rejects don't expire: re-running the pre-filters on the
+# stored search metadata could only give the same answer. They are evaluated
+# again instead whenever the PREFILTER_* settings change.
+VERDICT_TTL_DAYS = {"rejected_python": 90, "swe_failed": 30, "swe_passed": None, "rejected_prefilter": None}
+# Expired verdicts re-checked per run, latest push and most stars first. Each
+# costs at most one languages call and one SWE-Bench request.
+REVALIDATION_BUDGET = 25
+
+# Run report (per-stage time, requests, latencies, sleeps, rate-limit budget,
+# cache hit rate) written at the end of every run. Empty disables it.
+METRICS_REPORT_FILE = os.getenv("REPOS_FINDER_METRICS_FILE", "run_report.json")
+# The same report as a Prometheus textfile, e.g. into node_exporter's
+# --collector.textfile.directory. Unset by default.
+METRICS_PROMETHEUS_FILE = os.getenv("REPOS_FINDER_PROMETHEUS_FILE")
+# Upper bounds (seconds) of the request latency histogram buckets
+METRICS_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Comma-separated stages to run under cProfile, e.g. REPOS_FINDER_PROFILE=search,swe_bench.
+# Stages: search, clean, python_percentage, swe_bench, swe_bench_parse, export.
+# One merged <stage>.prof per stage is written to PROFILE_DIR (open with pstats or snakeviz).
+PROFILE_STAGES = [stage.strip() for stage in os.getenv("REPOS_FINDER_PROFILE", "").split(",") if stage.strip()]
+PROFILE_DIR = "profiles"
+
 # SWE-Bench configurations
-SWE_BENCH_BASE_URL = "https://swe-bench-plus.turing.com/repos/"
+SWE_BENCH_BASE_URL = os.getenv("SWE_BENCH_BASE_URL", "https://swe-bench-plus.turing.com/repos/")
 # The filter query parameter, URL encoded
 SWE_BENCH_FILTER_PARAMS = "?filter=%7B%22minDate%22%3A%222024-11-01%22%7D"
 
@@ -35,6 +153,48 @@ SWE_BENCH_BACKOFF_FACTOR = 0.5
 SWE_BENCH_MAX_CONSECUTIVE_REQUESTS = 40
 SWE_BENCH_LONG_PAUSE_DURATION = 300
 
+# How batch counts are extracted from SWE-Bench pages: "lxml" (streaming, stops
+# after the batch table), "strainer" (BeautifulSoup restricted to the table)
+# or "bs4" (full BeautifulSoup tree). See swe_bench_parser.py.
+SWE_BENCH_PARSER = "lxml"
+# Processes that parse fetched SWE-Bench pages, so parsing never holds up the
+# fetch threads (see benchmarks/bench_parse_offload.py). 0 parses each page
+# inline, on the thread that fetched it.
+SWE_BENCH_PARSE_WORKERS = 0
+
+# SWE-Bench request scheduling: "adaptive" (token bucket, see scheduler.py) or
+# "fixed" (the random delays and long pauses configured above)
+SWE_BENCH_SCHEDULER = "adaptive"
+# Target rate. The adaptive scheduler never goes above it.
+SWE_BENCH_REQUESTS_PER_MINUTE = 6.0
+# Floor the rate is never cut below by repeated errors
+SWE_BENCH_MIN_REQUESTS_PER_MINUTE = 0.5
+# On an error or 429/503 the rate is multiplied by this...
+SWE_BENCH_BACKOFF_MULTIPLIER = 0.5
+# ...and every success adds this many requests/minute back
+SWE_BENCH_RECOVERY_PER_MINUTE = 0.25
+# Requests that may be sent back to back after an idle period
+SWE_BENCH_BURST = 1
+# Requests allowed to be waiting on the server at the same time
+SWE_BENCH_MAX_IN_FLIGHT = 2
+# Times a repo is re-queued after a 429/503 before it is left for the next run
+SWE_BENCH_MAX_THROTTLE_RETRIES = 3
+
+# Work-queue mode (see work_queue.py): `run.py check-swe-bench --enqueue` (or
+# `run.py --enqueue`) queues the repos that pass the filters here instead of
+# checking them, any number of `run.py check-swe-bench --worker` processes
+# check them under one shared request budget (SWE_BENCH_REQUESTS_PER_MINUTE in
+# total), and `run.py merge` collects their verdicts. The file may sit on a
+# volume shared by several hosts, if the volume supports file locking.
+WORK_QUEUE_DB_FILE = os.getenv("REPOS_FINDER_WORK_QUEUE", "swe_bench_queue.db")
+# A claimed repo goes back to the queue if its worker stops renewing the lease for this long
+WORK_QUEUE_LEASE_SECONDS = 300
+WORK_QUEUE_HEARTBEAT_SECONDS = 60
+# Leases of one repo allowed to expire before it is set aside as dead
+WORK_QUEUE_MAX_ATTEMPTS = 3
+# How often an idle worker looks for leases that have expired elsewhere
+WORK_QUEUE_POLL_SECONDS = 15
+
 def get_random_user_agent():
     return random.choice(USER_AGENTS)
 
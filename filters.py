@@ -0,0 +1,167 @@
+import json
+from pipeline import counted
+from metrics import get_metrics
+from registry import STATUS_REJECTED_PREFILTER
+from config import (PREFILTER_EXCLUDE_ARCHIVED, PREFILTER_EXCLUDE_FORKS, PREFILTER_MIN_SIZE_KB,
+                    PREFILTER_MAX_SIZE_KB, PREFILTER_LANGUAGES, PREFILTER_MIN_OPEN_ISSUES,
+                    PREFILTER_EXCLUDED_TOPICS, FILTER_COST_LOCAL, FILTER_PRIOR_SELECTIVITY, FILTER_PRIOR_WEIGHT)
+
+# Filter kinds, from cheapest to most expensive
+KIND_LOCAL = "local" # a predicate on the search metadata
+KIND_API = "api" # a GitHub API call per repo (or per batch)
+KIND_SCRAPE = "scrape" # a rate-limited SWE-Bench page
+
+_REJECT_FLUSH_SIZE = 100
+
+
+class RepoFilter:
+    """
+    One step of the filter chain and what it is expected to cost.
+
+    Local filters have a `predicate(repo)`. API and scrape filters have a
+    `stage(repos)` that consumes a stream of repos, yields the ones that pass
+    and records its own rejects. `cost` is the expected seconds per repo and
+    `selectivity` the expected share of repos that pass.
+    """
+
+    def __init__(self, name, kind, cost, selectivity, predicate=None, stage=None):
+        self.name = name
+        self.kind = kind
+        self.cost = cost
+        self.selectivity = selectivity
+        self.predicate = predicate
+        self.stage = stage
+
+    def rank(self):
+        # Filters that are cheap and drop many repos go first
+        return self.cost / max(1 - self.selectivity, 0.001)
+
+    def __repr__(self):
+        return f"{self.name} ({self.kind}, {self.cost:g}s/repo, {self.selectivity * 100:.0f}% pass)"
+
+
+def _not_archived(repo):
+    return not repo.get("archived")
+
+
+def _not_fork(repo):
+    return not repo.get("fork")
+
+
+def _size_in_bounds(repo):
+    size = repo.get("size")
+    if size is None:
+        return True
+    if PREFILTER_MIN_SIZE_KB is not None and size < PREFILTER_MIN_SIZE_KB:
+        return False
+    return PREFILTER_MAX_SIZE_KB is None or size <= PREFILTER_MAX_SIZE_KB
+
+
+def _primary_language(repo):
+    return repo.get("language") is None or repo.get("language") in PREFILTER_LANGUAGES
+
+
+def _enough_open_issues(repo):
+    return repo.get("open_issues") is None or repo["open_issues"] >= PREFILTER_MIN_OPEN_ISSUES
+
+
+def _no_excluded_topic(repo):
+    return not set(repo.get("topics") or ()) & set(PREFILTER_EXCLUDED_TOPICS)
+
+
+def local_filters():
+    # The pre-filters enabled in config, as RepoFilters
+    predicates = []
+    if PREFILTER_EXCLUDE_ARCHIVED:
+        predicates.append(("not_archived", _not_archived))
+    if PREFILTER_EXCLUDE_FORKS:
+        predicates.append(("not_fork", _not_fork))
+    if PREFILTER_MIN_SIZE_KB is not None or PREFILTER_MAX_SIZE_KB is not None:
+        predicates.append(("size", _size_in_bounds))
+    if PREFILTER_LANGUAGES:
+        predicates.append(("primary_language", _primary_language))
+    if PREFILTER_MIN_OPEN_ISSUES:
+        predicates.append(("open_issues", _enough_open_issues))
+    if PREFILTER_EXCLUDED_TOPICS:
+        predicates.append(("topics", _no_excluded_topic))
+    return [RepoFilter(name, KIND_LOCAL, FILTER_COST_LOCAL, FILTER_PRIOR_SELECTIVITY[KIND_LOCAL], predicate=predicate)
+            for name, predicate in predicates]
+
+
+def prefilter_config():
+    # The pre-filter settings as a string, stored with the rejects (see RepoRegistry.requeue_prefilter_rejects)
+    return json.dumps({
+        "exclude_archived": PREFILTER_EXCLUDE_ARCHIVED,
+        "exclude_forks": PREFILTER_EXCLUDE_FORKS,
+        "min_size_kb": PREFILTER_MIN_SIZE_KB,
+        "max_size_kb": PREFILTER_MAX_SIZE_KB,
+        "languages": sorted(PREFILTER_LANGUAGES),
+        "min_open_issues": PREFILTER_MIN_OPEN_ISSUES,
+        "excluded_topics": sorted(PREFILTER_EXCLUDED_TOPICS),
+    }, sort_keys=True)
+
+
+def plan_filters(filters, history, prior_weight=FILTER_PRIOR_WEIGHT):
+    """
+    Returns `filters` in the order they should run. Each filter's selectivity
+    is first refined with `history` ({name: (evaluated, passed)}, see
+    RepoRegistry.filter_stats), weighing its prior as `prior_weight` repos.
+    Filters then run by increasing cost / (1 - selectivity), except that
+    scrape filters always run last: the run queue and --resume keep track
+    of the repos waiting for them.
+    """
+    for repo_filter in filters:
+        evaluated, passed = history.get(repo_filter.name, (0, 0))
+        repo_filter.selectivity = (passed + repo_filter.selectivity * prior_weight) / (evaluated + prior_weight)
+    return sorted(filters, key=lambda repo_filter: (repo_filter.kind == KIND_SCRAPE, repo_filter.rank()))
+
+
+def iter_prefiltered(repos, filters, stats, registry=None):
+    """
+    Yields the repos that pass every local filter in `filters`, in order.
+    Each repo stops at the first filter it fails and is recorded in `registry`
+    as STATUS_REJECTED_PREFILTER with the filter's name in "rejected_by".
+    """
+    rejected = []
+    try:
+        for repo in repos:
+            for repo_filter in filters:
+                counts = stats.setdefault(repo_filter.name, {})
+                counts["evaluated"] = counts.get("evaluated", 0) + 1
+                if not repo_filter.predicate(repo):
+                    rejected.append(({**repo, "rejected_by": repo_filter.name}, STATUS_REJECTED_PREFILTER))
+                    break
+                counts["passed"] = counts.get("passed", 0) + 1
+            else:
+                yield repo
+                continue
+            if registry is not None and len(rejected) >= _REJECT_FLUSH_SIZE:
+                registry.record_verdicts(rejected)
+                rejected = []
+    finally:
+        if registry is not None and rejected:
+            registry.record_verdicts(rejected)
+
+
+def apply_filters(repos, planned, stats, registry=None):
+    """
+    Chains the planned filters, except scrape filters, over the stream
+    `repos`. Runs of consecutive local filters are applied together in one
+    pass; every other filter's stage gets the output of the one before it.
+    Evaluated and passed counts are added to `stats`.
+    """
+    planned = [repo_filter for repo_filter in planned if repo_filter.kind != KIND_SCRAPE]
+    index = 0
+    while index < len(planned):
+        if planned[index].kind == KIND_LOCAL:
+            run = []
+            while index < len(planned) and planned[index].kind == KIND_LOCAL:
+                run.append(planned[index])
+                index += 1
+            repos = get_metrics().timed(iter_prefiltered(repos, run, stats, registry), "prefilter")
+            continue
+        repo_filter = planned[index]
+        counts = stats.setdefault(repo_filter.name, {})
+        repos = counted(repo_filter.stage(counted(repos, counts, "evaluated")), counts, "passed")
+        index += 1
+    return repos
@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from metrics import get_metrics
+from config import (GITHUB_API_BASE_URL, GITHUB_MAX_RETRIES, GITHUB_BACKOFF_FACTOR, GITHUB_REQUEST_TIMEOUT,
+                    GITHUB_MAX_WORKERS, GITHUB_RATE_LIMIT_RESERVE, GITHUB_SEARCH_REQUESTS_PER_MINUTE)
+
+
+def create_github_session(pool_size=GITHUB_MAX_WORKERS):
+    """
+    Returns a requests.Session whose connection pool is large enough to be
+    shared by `pool_size` worker threads.
+    """
+    session = requests.Session()
+    retry_strategy = Retry(
+        total=GITHUB_MAX_RETRIES,
+        status_forcelist=[500, 502, 503, 504], # 403/429 are handled by GitHubRateLimiter
+        allowed_methods=["HEAD", "GET", "OPTIONS", "POST"],
+        backoff_factor=GITHUB_BACKOFF_FACTOR
+    )
+    adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class GitHubRateLimiter:
+    """
+    Tracks the GitHub rate-limit budget from the X-RateLimit-* response headers
+    and blocks callers once the remaining budget drops to `reserve`, until the
+    window resets. Safe to share between threads.
+    """
+
+    def __init__(self, reserve=GITHUB_RATE_LIMIT_RESERVE):
+        self.reserve = reserve
+        self.remaining = None
+        self.reset_at = None
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # Requests already in flight will consume budget too, so count them
+        # against the remaining budget before letting another one through.
+        while True:
+            with self._lock:
+                if self.remaining is None or self.remaining - self.in_flight > self.reserve:
+                    self.in_flight += 1
+                    return
+                wait = (self.reset_at or time.time()) - time.time() + 1
+                if wait <= 0:
+                    # The window has reset but no response told us yet
+                    self.remaining = None
+                    continue
+            print(f"GitHub rate limit nearly exhausted ({self.remaining} left). Sleeping {wait:.0f}s until reset...")
+            get_metrics().record_sleep("github_rate_limit", min(wait, 60))
+            time.sleep(min(wait, 60))
+
+    def release(self, response=None):
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if response is None:
+                return
+            remaining = response.headers.get("X-RateLimit-Remaining")
+            reset = response.headers.get("X-RateLimit-Reset")
+            if remaining is None or reset is None:
+                return
+            try:
+                remaining, reset = int(remaining), int(reset)
+            except ValueError:
+                return
+            # Responses can arrive out of order; keep the lowest count seen for
+            # the current window and start over when a new window begins.
+            if self.reset_at is None or reset > self.reset_at:
+                self.remaining, self.reset_at = remaining, reset
+            elif reset == self.reset_at:
+                self.remaining = min(self.remaining, remaining) if self.remaining is not None else remaining
+
+
+class SearchRateLimiter(GitHubRateLimiter):
+    """
+    GitHubRateLimiter for the search API, which has a separate per-minute
+    budget. On top of reacting to the X-RateLimit-* headers it paces requests
+    so that no more than `requests_per_minute` start in any 60 s window.
+    """
+
+    def __init__(self, requests_per_minute=GITHUB_SEARCH_REQUESTS_PER_MINUTE, reserve=0):
+        super().__init__(reserve=reserve)
+        self.requests_per_minute = requests_per_minute
+        self._started = deque()
+        self._window_lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._window_lock:
+                now = time.time()
+                while self._started and now - self._started[0] >= 60:
+                    self._started.popleft()
+                if len(self._started) < self.requests_per_minute:
+                    self._started.append(now)
+                    break
+                wait = 60 - (now - self._started[0])
+            get_metrics().record_sleep("github_search_pacing", wait)
+            time.sleep(wait)
+        super().acquire()
+
+
+def github_get(session, url, headers, limiter=None, cache=None, endpoint="github", **kwargs):
+    """
+    GET a GitHub API url through `session`, waiting on `limiter` first and
+    feeding the response's rate-limit headers back into it. A request that was
+    refused for rate limiting is retried once the budget has been restored.
+
+    With a `cache` (see http_cache.HTTPCache), fresh entries are served without
+    a request and stale ones are revalidated with a conditional request.
+    Requests are recorded in the run metrics under `endpoint`.
+    """
+    kwargs.setdefault("timeout", GITHUB_REQUEST_TIMEOUT)
+    entry = cache.lookup(url, headers) if cache is not None else None
+    if entry is not None and cache.is_fresh(entry):
+        cache.record("fresh")
+        return cache.build_response(url, entry)
+    request_headers = headers
+    if entry is not None:
+        request_headers = {**headers, **cache.conditional_headers(entry)}
+
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        response = None
+        started = time.perf_counter()
+        try:
+            response = session.get(url, headers=request_headers, **kwargs)
+        finally:
+            get_metrics().observe_request(endpoint, response, time.perf_counter() - started)
+            if limiter is not None:
+                limiter.release(response)
+        if limiter is None or response.status_code not in (403, 429):
+            break
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None and retry_after.isdigit():
+            # Secondary rate limit: GitHub tells us exactly how long to back off
+            print(f"GitHub secondary rate limit hit. Sleeping {retry_after}s...")
+            get_metrics().record_sleep("github_secondary_rate_limit", int(retry_after))
+            time.sleep(int(retry_after))
+        elif response.headers.get("X-RateLimit-Remaining") != "0":
+            break # A genuine 403, not rate limiting
+
+    if cache is None:
+        return response
+    if response.status_code == 304 and entry is not None:
+        cache.record("revalidated")
+        cache.refresh(url, headers, entry)
+        return cache.build_response(url, entry, not_modified_response=response)
+    cache.record("miss")
+    cache.store(url, headers, response)
+    return response
+
+
+def github_graphql(session, query, headers, limiter=None, **kwargs):
+    """
+    POST a GraphQL `query` to the GitHub GraphQL endpoint. GraphQL has its own
+    rate-limit budget, so pass a limiter that is not shared with REST calls.
+    """
+    kwargs.setdefault("timeout", GITHUB_REQUEST_TIMEOUT)
+    graphql_headers = headers.copy()
+    # The GraphQL API rejects the REST v3 media type
+    graphql_headers.pop("Accept", None)
+    if limiter is not None:
+        limiter.acquire()
+    response = None
+    started = time.perf_counter()
+    try:
+        response = session.post(f"{GITHUB_API_BASE_URL}/graphql", json={"query": query},
+                                headers=graphql_headers, **kwargs)
+        return response
+    finally:
+        get_metrics().observe_request("graphql", response, time.perf_counter() - started)
+        if limiter is not None:
+            limiter.release(response)
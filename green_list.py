@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from membership import repo_key
+from registry import STATUS_SWE_PASSED, atomic_open
+from config import SWE_BENCH_GREEN_LIST_NDJSON
+
+# Index file layout: header, then `count` records in green list order, then the
+# same `count` repos sorted by url hash. Record fields are native-endian int64s.
+_HEADER = struct.Struct("<8sQQQQ") # magic, registry version, count, valid data bytes, dead data bytes
+_MAGIC = b"RFGRN002"
+_ORDER_WIDTH = 5 # -pushed_at, -stars, url hash, offset, length
+_HASH_WIDTH = 3 # url hash, -pushed_at, -stars
+# Rewrite the NDJSON file once superseded lines take up more than half of it, and at least this much
+_COMPACT_MIN_BYTES = 1024 * 1024
+
+
+def _url_hash(url):
+    return int.from_bytes(hashlib.blake2b(repo_key(url).encode("utf-8"), digest_size=8).digest(), "little",
+                          signed=True)
+
+
+def _sort_key(repo):
+    # Newest push first, then most stars; repos without a push date go last
+    pushed = 0
+    if repo.get("pushed_at"):
+        try:
+            pushed = int(datetime.fromisoformat(repo["pushed_at"].replace("Z", "+00:00")).timestamp())
+        except ValueError:
+            pass
+    return -pushed, -(repo.get("stars") or 0)
+
+
+class _Keys:
+    # Read-only sequence of the sort keys of a flat record array, for bisect
+    def __init__(self, records, width, fields):
+        self.records = records
+        self.width = width
+        self.fields = fields
+
+    def __len__(self):
+        return len(self.records) // self.width
+
+    def __getitem__(self, index):
+        base = index * self.width
+        return tuple(self.records[base + field] for field in self.fields)
+
+
+def _without(records, width, positions):
+    # Copies `records` minus the records at `positions`, slice by slice
+    result, previous = array("q"), 0
+    for position in sorted(positions):
+        result.extend(records[previous * width:position * width])
+        previous = position + 1
+    result.extend(records[previous * width:])
+    return result
+
+
+def _with(records, width, key_fields, new_records):
+    # Copies `records` with `new_records` (sorted tuples) merged in at their bisected positions
+    keys = _Keys(records, width, key_fields)
+    result, previous = array("q"), 0
+    for record in new_records:
+        position = bisect_right(keys, record[:len(key_fields)])
+        result.extend(records[previous * width:position * width])
+        result.extend(record)
+        previous = position
+    result.extend(records[previous * width:])
+    return result
+
+
+class GreenList:
+    """
+    The repos that passed the SWE-Bench check as NDJSON (one repo object
+    per line), kept up to date with the registry incrementally.
+
+    Lines are only ever appended. A binary index file next to it lists them
+    in green list order (latest push, then most stars) and, for finding the
+    line of a repo whose verdict changed, by url hash. update() appends the
+    repos that passed since the last update and merges them into the index
+    by bisection, so no repo is loaded, parsed or sorted again. The NDJSON
+    file is rewritten in order once superseded lines take up half of it.
+
+    Index updates replace the index file atomically. Lines appended by an
+    update that never got indexed are truncated by the next one, and a
+    missing or damaged index makes update() rebuild both files from the
+    registry.
+    """
+
+    def __init__(self, path=SWE_BENCH_GREEN_LIST_NDJSON):
+        self.path = path
+        self.index_path = f"{path}.idx"
+
+    def _load(self):
+        # Returns (registry version, data_size, dead_bytes, order, by_hash), or None if there is no valid index
+        try:
+            with open(self.index_path, "rb") as f:
+                raw = f.read()
+        except OSError:
+            return None
+        if len(raw) < _HEADER.size:
+            return None
+        magic, watermark, count, data_size, dead_bytes = _HEADER.unpack_from(raw)
+        order_bytes = count * _ORDER_WIDTH * 8
+        if magic != _MAGIC or len(raw) != _HEADER.size + order_bytes + count * _HASH_WIDTH * 8:
+            return None
+        order, by_hash = array("q"), array("q")
+        order.frombytes(raw[_HEADER.size:_HEADER.size + order_bytes])
+        by_hash.frombytes(raw[_HEADER.size + order_bytes:])
+        return watermark, data_size, dead_bytes, order, by_hash
+
+    def _write_index(self, watermark, data_size, dead_bytes, order, by_hash):
+        with atomic_open(self.index_path, "wb", fsync=True) as f:
+            f.write(_HEADER.pack(_MAGIC, watermark, len(order) // _ORDER_WIDTH, data_size, dead_bytes))
+            order.tofile(f)
+            by_hash.tofile(f)
+
+    def __len__(self):
+        state = self._load()
+        return len(state[3]) // _ORDER_WIDTH if state else 0
+
+    def update(self, registry):
+        """
+        Applies the registry verdicts recorded since the last update: repos
+        that passed are added (or replace their old line), repos with any
+        other verdict are dropped. Returns (added, removed).
+        """
+        synced_version = registry.version() # Read first: later changes are picked up again next time
+        state = self._load()
+        if state is None or not os.path.exists(self.path):
+            count = self._write_all(registry.repos(STATUS_SWE_PASSED), synced_version)
+            print(f"Rebuilt the green list {self.path} from the registry.")
+            return count, 0
+        watermark, data_size, dead_bytes, order, by_hash = state
+        changes = registry.changed_since(watermark)
+        if not changes:
+            return 0, 0
+
+        # Drop the current line of every repo whose verdict changed
+        hash_keys = _Keys(by_hash, _HASH_WIDTH, (0,))
+        order_keys = _Keys(order, _ORDER_WIDTH, (0, 1))
+        stale_hashes, stale_hash_positions, stale_order_positions = set(), [], []
+        for url_hash in {_url_hash(repo["html_url"]) for repo, _ in changes}:
+            position = bisect_left(hash_keys, (url_hash,))
+            if position == len(hash_keys) or by_hash[position * _HASH_WIDTH] != url_hash:
+                continue
+            stale_hashes.add(url_hash)
+            stale_hash_positions.append(position)
+            base = position * _HASH_WIDTH
+            order_position = bisect_left(order_keys, (by_hash[base + 1], by_hash[base + 2]))
+            while order[order_position * _ORDER_WIDTH + 2] != url_hash:
+                order_position += 1
+            stale_order_positions.append(order_position)
+            dead_bytes += order[order_position * _ORDER_WIDTH + 4]
+        if not stale_hashes and all(status != STATUS_SWE_PASSED for _, status in changes):
+            # Nothing that was or is on the green list; only move the version on
+            self._write_index(synced_version, data_size, dead_bytes, order, by_hash)
+            return 0, 0
+        order = _without(order, _ORDER_WIDTH, stale_order_positions)
+        by_hash = _without(by_hash, _HASH_WIDTH, stale_hash_positions)
+
+        # Append the passes and merge them into both orders
+        new_records = []
+        with open(self.path, "r+b") as f:
+            f.truncate(data_size) # Lines of an update that never made it into the index
+            f.seek(data_size)
+            for repo, status in changes:
+                if status != STATUS_SWE_PASSED:
+                    continue
+                line = json.dumps(repo, ensure_ascii=False).encode("utf-8") + b"\n"
+                new_records.append(_sort_key(repo) + (_url_hash(repo["html_url"]), f.tell(), len(line)))
+                f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            data_size = f.tell()
+        new_records.sort(key=lambda record: record[:2])
+        order = _with(order, _ORDER_WIDTH, (0, 1), new_records)
+        by_hash = _with(by_hash, _HASH_WIDTH, (0,),
+                        sorted((record[2], record[0], record[1]) for record in new_records))
+        self._write_index(synced_version, data_size, dead_bytes, order, by_hash)
+
+        removed = len(stale_hashes - {record[2] for record in new_records})
+        if dead_bytes > max(_COMPACT_MIN_BYTES, data_size // 2):
+            self._write_all(list(self), synced_version)
+        return len(new_records), removed
+
+    def _write_all(self, repos, watermark):
+        # Rewrites the NDJSON file with `repos`, in green list order, and indexes it from scratch
+        records = []
+        with atomic_open(self.path, "wb", fsync=True) as f:
+            for repo in sorted(repos, key=_sort_key):
+                line = json.dumps(repo, ensure_ascii=False).encode("utf-8") + b"\n"
+                records.append(_sort_key(repo) + (_url_hash(repo["html_url"]), f.tell(), len(line)))
+                f.write(line)
+            data_size = f.tell()
+            # Without its index, a half-replaced pair of files is rebuilt rather than misread
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+        order = array("q", (field for record in records for field in record))
+        by_hash = array("q", (field for record in sorted((record[2], record[0], record[1]) for record in records)
+                              for field in record))
+        self._write_index(watermark, data_size, 0, order, by_hash)
+        return len(records)
+
+    def __iter__(self):
+        # Yields the repos in green list order
+        state = self._load()
+        if state is None:
+            return
+        order = state[3]
+        with open(self.path, "rb") as f:
+            for base in range(0, len(order), _ORDER_WIDTH):
+                f.seek(order[base + 3])
+                yield json.loads(f.read(order[base + 4]))
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from requests.structures import CaseInsensitiveDict
+from config import HTTP_CACHE_DIR, HTTP_CACHE_TTL, HTTP_CACHE_MAX_BYTES, HTTP_CACHE_ENABLED
+
+# Response headers worth keeping alongside a cached body
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Link")
+
+
+class HTTPCache:
+    """
+    On-disk cache of GET responses keyed by URL and auth scope.
+
+    Entries younger than `ttl` seconds are served without touching the network.
+    Older entries are revalidated with If-None-Match / If-Modified-Since, and a
+    304 answer is served from disk (GitHub does not count 304s against the rate
+    limit). The directory is kept under `max_bytes` by evicting the least
+    recently used entries.
+    """
+
+    def __init__(self, directory=HTTP_CACHE_DIR, ttl=HTTP_CACHE_TTL, max_bytes=HTTP_CACHE_MAX_BYTES,
+                 enabled=HTTP_CACHE_ENABLED):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _path(self, url, headers):
+        # Different tokens can see different data, so they get separate entries.
+        # Only a digest of the credential ends up on disk.
+        auth = (headers or {}).get("Authorization", "")
+        scope = hashlib.sha256(auth.encode("utf-8")).hexdigest()
+        key = hashlib.sha256(f"{scope}\n{url}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def lookup(self, url, headers):
+        # Returns the stored entry for url, or None
+        if not self.enabled:
+            return None
+        path = self._path(url, headers)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path) # Mark as recently used for LRU eviction
+            return entry
+        except (FileNotFoundError, json.JSONDecodeError, OSError):
+            return None
+
+    def is_fresh(self, entry):
+        return time.time() - entry.get("stored_at", 0) < self.ttl
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url, headers, response):
+        if not self.enabled or response.status_code != 200:
+            return
+        if not response.headers.get("ETag") and not response.headers.get("Last-Modified") and self.ttl <= 0:
+            return # Nothing would ever make this entry reusable
+        entry = {
+            "url": url,
+            "stored_at": time.time(),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "headers": {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers},
+            "body": response.text,
+        }
+        path = self._path(url, headers)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._track_size(os.path.getsize(path) - old_size)
+        except OSError as e:
+            print(f"Warning: Could not write HTTP cache entry for {url}: {e}")
+
+    def refresh(self, url, headers, entry):
+        # A 304 confirmed the entry; restart its TTL
+        entry["stored_at"] = time.time()
+        path = self._path(url, headers)
+        try:
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not refresh HTTP cache entry for {url}: {e}")
+
+    def build_response(self, url, entry, not_modified_response=None):
+        """
+        Turns a cache entry into a requests.Response. When `not_modified_response`
+        (the 304) is given its headers win, so rate-limit headers stay current.
+        """
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.encoding = "utf-8"
+        response._content = entry["body"].encode("utf-8")
+        response.headers = CaseInsensitiveDict(entry.get("headers", {}))
+        if not_modified_response is not None:
+            response.headers.update(not_modified_response.headers)
+            response.from_cache = "revalidated"
+        else:
+            response.from_cache = "fresh"
+        return response
+
+    def record(self, outcome):
+        with self._lock:
+            if outcome == "fresh":
+                self.hits += 1
+            elif outcome == "revalidated":
+                self.revalidated += 1
+            else:
+                self.misses += 1
+
+    def hit_rate(self):
+        total = self.hits + self.revalidated + self.misses
+        return (self.hits + self.revalidated) / total if total else 0.0
+
+    def summary(self):
+        return (f"{self.hit_rate() * 100:.1f}% ({self.hits} fresh, {self.revalidated} revalidated, "
+                f"{self.misses} misses)")
+
+    def _track_size(self, delta):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, _, size in self._entries())
+            else:
+                self._size += delta
+            if self._size <= self.max_bytes:
+                return
+            # Evict least recently used entries until we are under the bound
+            for path, _, size in sorted(self._entries(), key=lambda item: item[1]):
+                if self._size <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                    self._size -= size
+                except OSError:
+                    pass
+
+    def _entries(self):
+        # Yields (path, mtime, size) for every cache entry on disk
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    # One cache per process, so every stage contributes to the same hit rate
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = HTTPCache()
+    return _default_cache
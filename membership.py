@@ -0,0 +1,201 @@
+import bisect
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from config import MEMBERSHIP_INDEX_FILE, MEMBERSHIP_INDEX_MAX_OVERLAY
+
+# File layout: header, then `count` sorted 64-bit key hashes in native byte order
+# (the file is a local cache, rebuilt from the registry whenever needed)
+_HEADER = struct.Struct("<8sdQ") # magic, first_seen watermark, count
+_MAGIC = b"RFIDX001"
+_SORT_CHUNK = 1_000_000 # hashes sorted in memory at a time during a full rebuild
+
+
+def repo_key(value):
+    """
+    Normalizes a repo html_url or full_name to "owner/name", lowercased, the
+    way GitHub compares them.
+    """
+    value = value.strip().rstrip("/")
+    if "github.com/" in value:
+        value = value.split("github.com/", 1)[1]
+    if value.endswith(".git"):
+        value = value[:-4]
+    return value.lower()
+
+
+def key_hash(value):
+    return int.from_bytes(hashlib.blake2b(repo_key(value).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class MembershipIndex:
+    """
+    Answers "is this repo already in the registry?" for the search and clean
+    stages without loading every url into memory.
+
+    Every registry repo is stored as the 64-bit hash of its normalized
+    owner/name in a sorted file that is memory-mapped and binary-searched, so
+    memory use and load time stay flat as the registry grows. Repos added
+    since the file was written sit in a small in-memory overlay; the file is
+    rewritten (merging the overlay in) once the overlay exceeds
+    `max_overlay`, and rebuilt from scratch if repos were deleted from the
+    registry after it was written. The file is opened lazily, on the first
+    lookup. A hash collision (about one lookup in 10^13 with a million repos)
+    only makes a repo look known.
+    """
+
+    def __init__(self, registry, path=MEMBERSHIP_INDEX_FILE, max_overlay=MEMBERSHIP_INDEX_MAX_OVERLAY):
+        self.registry = registry
+        self.path = path
+        self.max_overlay = max_overlay
+        self._loaded = False
+        self._file = None
+        self._mmap = None
+        self._hashes = ()
+        self._overlay = set()
+        self._load_lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        # Several stages may ask first at the same time
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self.load()
+
+    def __contains__(self, value):
+        if not value:
+            return False
+        self._ensure_loaded()
+        h = key_hash(value)
+        if h in self._overlay:
+            return True
+        index = bisect.bisect_left(self._hashes, h)
+        return index < len(self._hashes) and self._hashes[index] == h
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._hashes) + len(self._overlay)
+
+    def load(self):
+        started = time.perf_counter()
+        header = self._read_header()
+        deleted_at = self.registry.deleted_at()
+        if header is None or (deleted_at is not None and deleted_at >= header[0]):
+            self.rebuild()
+            header = self._read_header()
+        self._open(header[1])
+        overlay_read_at = time.time()
+        self._overlay = {key_hash(url) for url in self.registry.urls_since(header[0])}
+        if len(self._overlay) > self.max_overlay:
+            self._merge_overlay(overlay_read_at)
+        self._loaded = True
+        print(f"Membership index: {len(self._hashes)} repos on disk + {len(self._overlay)} recent, "
+              f"loaded in {(time.perf_counter() - started) * 1000:.0f} ms.")
+
+    def close(self):
+        if self._mmap is not None:
+            self._hashes.release()
+            self._mmap.close()
+            self._file.close()
+        self._hashes, self._mmap, self._file = (), None, None
+        self._loaded = False
+
+    def _read_header(self):
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read(_HEADER.size)
+                size = os.fstat(f.fileno()).st_size
+        except OSError:
+            return None
+        if len(raw) < _HEADER.size:
+            return None
+        magic, watermark, count = _HEADER.unpack(raw)
+        if magic != _MAGIC or size != _HEADER.size + count * 8:
+            return None
+        return watermark, count
+
+    def _open(self, count):
+        self.close()
+        if not count:
+            return # mmap can't map an empty range
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._hashes = memoryview(self._mmap)[_HEADER.size:].cast("Q")
+
+    def _write(self, sorted_hashes, watermark):
+        # Streams sorted, deduplicated hashes into a new file that replaces the old one
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".membership-")
+        count, previous = 0, None
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, watermark, 0))
+            buffer = array("Q")
+            for h in sorted_hashes:
+                if h == previous:
+                    continue
+                buffer.append(h)
+                previous = h
+                count += 1
+                if len(buffer) >= 65536:
+                    buffer.tofile(f)
+                    buffer = array("Q")
+            buffer.tofile(f)
+            f.seek(0)
+            f.write(_HEADER.pack(_MAGIC, watermark, count))
+        self.close()
+        os.replace(tmp_path, self.path)
+
+    def rebuild(self):
+        """
+        Rewrites the file from every repo in the registry. Hashes are sorted
+        in chunks spilled to temporary files and merged, so memory stays
+        bounded however many repos there are.
+        """
+        watermark = time.time()
+        runs = []
+        try:
+            chunk = array("Q")
+            for url in self.registry.urls_since(None):
+                chunk.append(key_hash(url))
+                if len(chunk) >= _SORT_CHUNK:
+                    runs.append(_spill(chunk))
+                    chunk = array("Q")
+            if runs:
+                runs.append(_spill(chunk))
+                self._write(heapq.merge(*(_read_run(run) for run in runs)), watermark)
+            else:
+                self._write(sorted(chunk), watermark)
+        finally:
+            for run in runs:
+                run.close()
+
+    def _merge_overlay(self, watermark):
+        # Folds the overlay (every repo first seen up to `watermark`) into the
+        # file with one sequential merge
+        self._write(heapq.merge(iter(self._hashes), sorted(self._overlay)), watermark)
+        self._overlay = set()
+        self._open(self._read_header()[1])
+
+
+def _spill(chunk):
+    run = tempfile.TemporaryFile()
+    array("Q", sorted(chunk)).tofile(run)
+    run.seek(0)
+    return run
+
+
+def _read_run(run):
+    while True:
+        block = array("Q")
+        try:
+            block.fromfile(run, 65536)
+        except EOFError:
+            yield from block # fromfile keeps the items it did read
+            return
+        yield from block
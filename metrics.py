@@ -0,0 +1,404 @@
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from registry import atomic_open
+from config import METRICS_LATENCY_BUCKETS, PROFILE_STAGES, PROFILE_DIR
+
+PROMETHEUS_PREFIX = "repos_finder"
+# From Python 3.12 only one profiler can be active in the whole process, not one per thread
+_SINGLE_PROFILER = sys.version_info >= (3, 12)
+
+
+class RunMetrics:
+    """
+    Collects the measurements of one pipeline run: per-stage time and item
+    counts, per-endpoint requests with latency histograms and adapter retries,
+    time spent sleeping on rate limits, and the GitHub rate-limit budget
+    consumed. Safe to share between threads.
+
+    Stage time is exclusive: time a stage spends waiting on a nested stage,
+    on a pipeline buffer or in a rate-limit sleep on the same thread is not
+    counted as its own. Stages listed in `profile_stages` also run under
+    cProfile, both on the thread that drives the stage and in the worker
+    threads that wrap their calls in profiled().
+    """
+
+    def __init__(self, profile_stages=PROFILE_STAGES, latency_buckets=METRICS_LATENCY_BUCKETS):
+        self.profile_stages = set(profile_stages)
+        self.latency_buckets = tuple(sorted(latency_buckets))
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.wall_seconds = None
+        self.stages = {}
+        self.requests = {}
+        self.sleeps = {}
+        self.waits = {}
+        self.rate_limits = {}
+        self._profiles = {}
+        self._local = threading.local()
+        self._profiler_slot = threading.Lock() # Held by the profiling thread where _SINGLE_PROFILER
+        self._lock = threading.Lock()
+
+    # Stages
+
+    def _stage(self, name):
+        return self.stages.setdefault(name, {"items": 0, "busy_seconds": 0.0, "first_started": None,
+                                             "last_finished": None})
+
+    def _frames(self):
+        frames = getattr(self._local, "frames", None)
+        if frames is None:
+            frames = self._local.frames = []
+        return frames
+
+    def _exclude_from_current_stage(self, seconds):
+        frames = self._frames()
+        if frames:
+            frames[-1][0] += seconds
+
+    def _add_stage_time(self, name, started, elapsed, nested, items=0):
+        with self._lock:
+            stage = self._stage(name)
+            stage["busy_seconds"] += max(0.0, elapsed - nested)
+            stage["items"] += items
+            if stage["first_started"] is None:
+                stage["first_started"] = started - self._start
+            stage["last_finished"] = started + elapsed - self._start
+
+    def timed(self, iterable, name):
+        """
+        Passes the items of `iterable` through, timing every step as stage
+        `name` (and profiling it, if the stage is profiled).
+        """
+        iterator = iter(iterable)
+        frames = self._frames()
+        try:
+            while True:
+                started = time.perf_counter()
+                frame = [0.0]
+                frames.append(frame)
+                produced = False
+                try:
+                    with self.profiled(name):
+                        item = next(iterator)
+                    produced = True
+                except StopIteration:
+                    pass
+                finally:
+                    frames.pop()
+                    elapsed = time.perf_counter() - started
+                    self._exclude_from_current_stage(elapsed)
+                    self._add_stage_time(name, started, elapsed, frame[0], items=int(produced))
+                if not produced:
+                    return
+                yield item
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    @contextmanager
+    def stage(self, name):
+        # Times a block of work (not a stream) as stage `name`; items counts the blocks
+        started = time.perf_counter()
+        frames = self._frames()
+        frame = [0.0]
+        frames.append(frame)
+        try:
+            with self.profiled(name):
+                yield
+        finally:
+            frames.pop()
+            elapsed = time.perf_counter() - started
+            self._exclude_from_current_stage(elapsed)
+            self._add_stage_time(name, started, elapsed, frame[0], items=1)
+
+    def record_stage(self, name, seconds, items=1):
+        # Adds work timed outside this process (e.g. in a parser process) to stage `name`
+        self._add_stage_time(name, time.perf_counter() - seconds, seconds, 0.0, items=items)
+
+    @contextmanager
+    def waiting(self, reason):
+        # Times a block spent waiting on another stage; it is not counted as
+        # busy time of the stage running on this thread
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self._exclude_from_current_stage(elapsed)
+            with self._lock:
+                self.waits[reason] = self.waits.get(reason, 0.0) + elapsed
+
+    def record_sleep(self, reason, seconds):
+        # Call right before sleeping for a rate limit or pacing delay
+        if seconds <= 0:
+            return
+        self._exclude_from_current_stage(seconds)
+        with self._lock:
+            entry = self.sleeps.setdefault(reason, {"count": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+
+    # Profiling
+
+    @contextmanager
+    def profiled(self, name):
+        """
+        Runs the block under this thread's cProfile profiler for stage `name`,
+        if that stage is profiled and no other profiler is active on the thread
+        (from Python 3.12: in the process, so only one thread at a time is
+        profiled). A profiler that cannot be enabled is skipped: profiling
+        must never change what the block does.
+        """
+        if name not in self.profile_stages or getattr(self._local, "profiling", False):
+            yield
+            return
+        if _SINGLE_PROFILER and not self._profiler_slot.acquire(blocking=False):
+            yield # Another thread is being profiled
+            return
+        try:
+            profilers = getattr(self._local, "profilers", None)
+            if profilers is None:
+                profilers = self._local.profilers = {}
+            profiler = profilers.get(name)
+            if profiler is None:
+                profiler = profilers[name] = cProfile.Profile()
+                with self._lock:
+                    self._profiles.setdefault(name, []).append(profiler)
+            try:
+                profiler.enable()
+                enabled = True
+            except ValueError:
+                enabled = False # e.g. "Another profiling tool is already active"
+            self._local.profiling = enabled
+            try:
+                yield
+            finally:
+                if enabled:
+                    profiler.disable()
+                    self._local.profiling = False
+        finally:
+            if _SINGLE_PROFILER:
+                self._profiler_slot.release()
+
+    def write_profiles(self, directory=PROFILE_DIR):
+        # Merges every thread's profile of a stage into <directory>/<stage>.prof
+        written = {}
+        with self._lock:
+            profiles = {name: list(profilers) for name, profilers in self._profiles.items()}
+        for name, profilers in profiles.items():
+            stats = None
+            for profiler in profilers:
+                try:
+                    stats = pstats.Stats(profiler) if stats is None else stats.add(profiler)
+                except TypeError:
+                    continue # The profiler never recorded anything
+            if stats is None:
+                continue
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{name}.prof")
+            stats.dump_stats(path)
+            written[name] = path
+        return written
+
+    # Requests
+
+    def observe_request(self, endpoint, response, seconds):
+        """
+        Records one request to `endpoint`: its final status ("error" without a
+        response), latency, the retries the urllib3 Retry adapter made before
+        it, and the rate-limit headers it carried.
+        """
+        status = str(response.status_code) if response is not None else "error"
+        retries = 0
+        raw_retries = getattr(getattr(response, "raw", None), "retries", None)
+        if raw_retries is not None:
+            retries = len(raw_retries.history)
+        with self._lock:
+            entry = self.requests.setdefault(endpoint, {
+                "count": 0, "by_status": {}, "retries": 0, "seconds": 0.0,
+                "latency_buckets": [0] * len(self.latency_buckets),
+            })
+            entry["count"] += 1
+            entry["by_status"][status] = entry["by_status"].get(status, 0) + 1
+            entry["retries"] += retries
+            entry["seconds"] += seconds
+            for index, bound in enumerate(self.latency_buckets):
+                if seconds <= bound:
+                    entry["latency_buckets"][index] += 1
+                    break
+            if response is not None:
+                self._observe_rate_limit(endpoint, response.headers)
+
+    def _observe_rate_limit(self, endpoint, headers):
+        # The budget this run consumed in a window is how far X-RateLimit-Remaining
+        # fell across the responses seen in it, counting the first of them
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        try:
+            remaining, reset = int(remaining), int(reset)
+        except ValueError:
+            return
+        resource = headers.get("X-RateLimit-Resource") or endpoint
+        budget = self.rate_limits.setdefault(resource, {"reset": None, "high": None, "low": None,
+                                                        "earlier_windows": 0, "limit": None})
+        if budget["reset"] is None or reset > budget["reset"]:
+            if budget["reset"] is not None:
+                budget["earlier_windows"] += budget["high"] - budget["low"] + 1
+            budget["reset"], budget["high"], budget["low"] = reset, remaining, remaining
+        elif reset == budget["reset"]:
+            budget["high"] = max(budget["high"], remaining)
+            budget["low"] = min(budget["low"], remaining)
+        limit = headers.get("X-RateLimit-Limit")
+        if limit is not None and limit.isdigit():
+            budget["limit"] = int(limit)
+
+    # Reports
+
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self._start
+
+    def report(self, cache=None, counts=None):
+        """
+        Returns the run report as a JSON-serializable dict. `cache` (an
+        HTTPCache) adds its hit rate; `counts` adds pipeline item counts.
+        """
+        wall_seconds = self.wall_seconds if self.wall_seconds is not None else time.perf_counter() - self._start
+        with self._lock:
+            stages = {name: {"items": stage["items"], "busy_seconds": round(stage["busy_seconds"], 3),
+                             "first_started": round(stage["first_started"] or 0.0, 3),
+                             "last_finished": round(stage["last_finished"] or 0.0, 3)}
+                      for name, stage in self.stages.items()}
+            endpoints = {}
+            for endpoint, entry in self.requests.items():
+                cumulative, running = [], 0
+                for bound, count in zip(self.latency_buckets, entry["latency_buckets"]):
+                    running += count
+                    cumulative.append([bound, running])
+                endpoints[endpoint] = {
+                    "requests": entry["count"], "by_status": dict(entry["by_status"]),
+                    "retries": entry["retries"], "seconds": round(entry["seconds"], 3),
+                    "mean_latency": round(entry["seconds"] / entry["count"], 4) if entry["count"] else None,
+                    "latency_buckets": cumulative,
+                }
+            sleeps = {reason: {"count": entry["count"], "seconds": round(entry["seconds"], 3)}
+                      for reason, entry in self.sleeps.items()}
+            waits = {reason: round(seconds, 3) for reason, seconds in self.waits.items()}
+            rate_limits = {resource: {"consumed": budget["earlier_windows"] + budget["high"] - budget["low"] + 1,
+                                      "remaining": budget["low"], "limit": budget["limit"],
+                                      "reset": budget["reset"]}
+                           for resource, budget in self.rate_limits.items()}
+        report = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "wall_seconds": round(wall_seconds, 3),
+            "stages": stages,
+            "endpoints": endpoints,
+            # Thread-seconds: concurrent requests and sleeps overlap, so these can exceed wall time
+            "time": {
+                "request_seconds": round(sum(entry["seconds"] for entry in endpoints.values()), 3),
+                "sleep_seconds": round(sum(entry["seconds"] for entry in sleeps.values()), 3),
+                "sleeps": sleeps,
+                "buffer_waits": waits,
+            },
+            "rate_limits": rate_limits,
+        }
+        if cache is not None:
+            report["cache"] = {"fresh": cache.hits, "revalidated": cache.revalidated, "misses": cache.misses,
+                               "hit_rate": round(cache.hit_rate(), 4)}
+        if counts is not None:
+            report["counts"] = dict(counts)
+        return report
+
+
+def _write_text(file_path, text):
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    with atomic_open(file_path) as f:
+        f.write(text)
+
+
+def write_json_report(file_path, report):
+    _write_text(file_path, json.dumps(report, indent=2) + "\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def format_prometheus(report):
+    """
+    Renders a run report in the Prometheus text exposition format, for
+    node_exporter's textfile collector.
+    """
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{PROMETHEUS_PREFIX}_{name}{labels} {value}")
+
+    metric("run_wall_seconds", "gauge", "Wall time of the last pipeline run.",
+           [("", report["wall_seconds"])])
+    metric("stage_busy_seconds", "gauge", "Time each stage spent working, excluding waits on other stages.",
+           [(_labels(stage=name), stage["busy_seconds"]) for name, stage in report["stages"].items()])
+    metric("stage_items", "gauge", "Items each stage produced.",
+           [(_labels(stage=name), stage["items"]) for name, stage in report["stages"].items()])
+    metric("requests_total", "counter", "Requests by endpoint and final status.",
+           [(_labels(endpoint=endpoint, status=status), count)
+            for endpoint, entry in report["endpoints"].items() for status, count in entry["by_status"].items()])
+    metric("request_retries_total", "counter", "Retries made by the HTTP adapter, by endpoint.",
+           [(_labels(endpoint=endpoint), entry["retries"]) for endpoint, entry in report["endpoints"].items()])
+
+    lines.append(f"# HELP {PROMETHEUS_PREFIX}_request_duration_seconds Request latency by endpoint.")
+    lines.append(f"# TYPE {PROMETHEUS_PREFIX}_request_duration_seconds histogram")
+    for endpoint, entry in report["endpoints"].items():
+        for bound, count in entry["latency_buckets"]:
+            lines.append(f"{PROMETHEUS_PREFIX}_request_duration_seconds_bucket"
+                         f"{_labels(endpoint=endpoint, le=bound)} {count}")
+        lines.append(f"{PROMETHEUS_PREFIX}_request_duration_seconds_bucket"
+                     f"{_labels(endpoint=endpoint, le='+Inf')} {entry['requests']}")
+        lines.append(f"{PROMETHEUS_PREFIX}_request_duration_seconds_sum{_labels(endpoint=endpoint)} "
+                     f"{entry['seconds']}")
+        lines.append(f"{PROMETHEUS_PREFIX}_request_duration_seconds_count{_labels(endpoint=endpoint)} "
+                     f"{entry['requests']}")
+
+    metric("sleep_seconds_total", "counter", "Time spent sleeping on rate limits and pacing, by reason.",
+           [(_labels(reason=reason), entry["seconds"]) for reason, entry in report["time"]["sleeps"].items()])
+    metric("rate_limit_consumed", "gauge", "GitHub rate-limit budget consumed during the run, by resource.",
+           [(_labels(resource=resource), budget["consumed"]) for resource, budget in report["rate_limits"].items()])
+    metric("rate_limit_remaining", "gauge", "GitHub rate-limit budget left at the end of the run, by resource.",
+           [(_labels(resource=resource), budget["remaining"]) for resource, budget in report["rate_limits"].items()])
+    if "cache" in report:
+        metric("http_cache_hit_ratio", "gauge", "Share of GitHub GETs answered from the HTTP cache.",
+               [("", report["cache"]["hit_rate"])])
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(file_path, report):
+    # Written atomically, as the textfile collector may read it at any moment
+    _write_text(file_path, format_prometheus(report))
+
+
+_metrics = None
+
+
+def get_metrics():
+    # One collector per process; reset_metrics() starts a new one for each run
+    global _metrics
+    if _metrics is None:
+        _metrics = RunMetrics()
+    return _metrics
+
+
+def reset_metrics(**kwargs):
+    global _metrics
+    _metrics = RunMetrics(**kwargs)
+    return _metrics
@@ -1,25 +1,56 @@
+import math
+import queue
+import re
+import threading
 import requests
-from config import get_github_header
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date, datetime, timedelta, timezone
+from config import (GITHUB_API_BASE_URL, GITHUB_SEARCH_SHARD_FIELD, GITHUB_SEARCH_MAX_RESULTS,
+                    GITHUB_SEARCH_PER_PAGE, GITHUB_SEARCH_SHARD_WORKERS, GITHUB_SEARCH_SHARDED, PIPELINE_BUFFER_SIZE,
+                    get_github_header)
+from github_api import create_github_session, github_get, GitHubRateLimiter, SearchRateLimiter
+from http_cache import get_default_cache
+from metrics import get_metrics
+from pipeline import merged
 
 per_page = 20 # first 100 results
 start_page = 1
 to_page = 10
-headers = get_github_header()
+_headers = None
 
-def get_github_repositories(query):
+
+def _github_headers():
+    # Built on first use rather than at import, so importing this module sends and prints nothing
+    global _headers
+    if _headers is None:
+        _headers = get_github_header()
+    return _headers
+
+
+def iter_github_repositories(query, limiter=None):
+    """
+    Yields the repositories matching `query` page by page, as soon as each
+    page has been parsed.
+    """
     print(f"Searching GitHub with query: {query}")
-    all_items = []
+    found = 0
+    session = create_github_session(pool_size=1)
+    if limiter is None:
+        limiter = GitHubRateLimiter()
+    response = None
     for page in range(start_page, to_page + 1):
-        url = f"https://api.github.com/search/repositories?q={query}&per_page={per_page}&page={page}"
+        url = f"{GITHUB_API_BASE_URL}/search/repositories?q={query}&per_page={per_page}&page={page}"
         print(f"Fetching page {page}...")
         try:
-            response = requests.get(url, headers=headers)
+            response = github_get(session, url, _github_headers(), limiter, cache=get_default_cache(),
+                                  endpoint="search")
             response.raise_for_status()
             results = response.json()
             items = results.get('items', [])
             if not items:
                 break
-            all_items.extend(items)
+            found += len(items)
+            yield from items
             if len(items) < per_page:
                 break  # Last page reached
         except requests.exceptions.HTTPError as http_err:
@@ -36,8 +67,252 @@ def get_github_repositories(query):
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
             break
-    if not all_items:
+    session.close()
+    if not found:
         print("No repositories found.")
     else:
-        print(f"Found {len(all_items)} repositories.")
-    return all_items
+        print(f"Found {found} repositories.")
+
+
+def get_github_repositories(query):
+    return list(iter_github_repositories(query))
+
+
+# Bounds used when a query leaves one side of the shard range open
+SHARD_FIELD_BOUNDS = {
+    "pushed": (date(2008, 1, 1), None), # None: today
+    "stars": (0, 1_000_000),
+}
+
+
+def _parse_bound(field, value):
+    return date.fromisoformat(value) if field == "pushed" else int(value)
+
+
+def _shift(field, value, step):
+    return value + timedelta(days=step) if field == "pushed" else value + step
+
+
+def parse_range_qualifier(query, field):
+    """
+    Extracts the `field:` qualifier from a search query.
+
+    Returns (low, high, rest_of_query) where low/high are inclusive bounds
+    (dates for "pushed", ints for "stars") and rest_of_query is the query with
+    the qualifier removed.
+    """
+    low, high = SHARD_FIELD_BOUNDS[field]
+    if high is None:
+        high = datetime.now(timezone.utc).date()
+    match = re.search(rf"(?:^|\s){field}:(\S+)", query)
+    if not match:
+        return low, high, query.strip()
+    rest = (query[:match.start()] + " " + query[match.end():]).strip()
+    value = match.group(1)
+    if ".." in value:
+        start, end = value.split("..", 1)
+        if start != "*":
+            low = _parse_bound(field, start)
+        if end != "*":
+            high = _parse_bound(field, end)
+    elif value.startswith(">="):
+        low = _parse_bound(field, value[2:])
+    elif value.startswith(">"):
+        low = _shift(field, _parse_bound(field, value[1:]), 1)
+    elif value.startswith("<="):
+        high = _parse_bound(field, value[2:])
+    elif value.startswith("<"):
+        high = _shift(field, _parse_bound(field, value[1:]), -1)
+    else:
+        low = high = _parse_bound(field, value)
+    return low, high, " ".join(rest.split())
+
+
+def _bisect(field, low, high):
+    # Splits an inclusive range into two adjacent halves, or returns None if it cannot be split
+    if low >= high:
+        return None
+    if field == "pushed":
+        mid = low + timedelta(days=(high - low).days // 2)
+    else:
+        mid = (low + high) // 2
+    return (low, mid), (_shift(field, mid, 1), high)
+
+
+def _format_bound(field, value):
+    return value.isoformat() if field == "pushed" else str(value)
+
+
+def _shard_query(rest, field, low, high):
+    return f"{rest} {field}:{_format_bound(field, low)}..{_format_bound(field, high)}".strip()
+
+
+def _fetch_search_page(session, limiter, query, page, per_page):
+    url = f"{GITHUB_API_BASE_URL}/search/repositories?q={query}&per_page={per_page}&page={page}"
+    response = github_get(session, url, _github_headers(), limiter, cache=get_default_cache(), endpoint="search")
+    response.raise_for_status()
+    return response.json()
+
+
+def _fetch_shard(session, limiter, rest, field, low, high, per_page, emit):
+    """
+    Fetches every result of one shard, handing each page's items to `emit` as
+    soon as the page arrives. Returns a list of child shards if the shard
+    matches more than GITHUB_SEARCH_MAX_RESULTS and can still be bisected,
+    otherwise an empty list.
+    """
+    with get_metrics().profiled("search"):
+        return _fetch_shard_pages(session, limiter, rest, field, low, high, per_page, emit)
+
+
+def _fetch_shard_pages(session, limiter, rest, field, low, high, per_page, emit):
+    query = _shard_query(rest, field, low, high)
+    first_page = _fetch_search_page(session, limiter, query, 1, per_page)
+    total_count = first_page.get("total_count", 0)
+    if total_count > GITHUB_SEARCH_MAX_RESULTS:
+        halves = _bisect(field, low, high)
+        if halves is not None:
+            print(f"  Shard '{query}' has {total_count} results. Splitting...")
+            return list(halves)
+        print(f"  Warning: Shard '{query}' has {total_count} results but cannot be split further. "
+              f"Only the first {GITHUB_SEARCH_MAX_RESULTS} will be fetched.")
+    page_items = first_page.get("items", [])
+    fetched = len(page_items)
+    if not emit(page_items):
+        return []
+    last_page = math.ceil(min(total_count, GITHUB_SEARCH_MAX_RESULTS) / per_page)
+    for page in range(2, last_page + 1):
+        if len(page_items) < per_page:
+            break
+        page_items = _fetch_search_page(session, limiter, query, page, per_page).get("items", [])
+        fetched += len(page_items)
+        if not emit(page_items):
+            return []
+    print(f"  Shard '{query}': {fetched} of {total_count} repositories fetched.")
+    return []
+
+
+def iter_github_repositories_sharded(query, shard_field=GITHUB_SEARCH_SHARD_FIELD,
+                                     max_workers=GITHUB_SEARCH_SHARD_WORKERS, per_page=GITHUB_SEARCH_PER_PAGE,
+                                     limiter=None):
+    """
+    Yields every repository matching `query`, working around the search API's
+    1000-result cap.
+
+    The query's `shard_field` range (e.g. pushed:>2024-11-01) is split into
+    adjacent ranges, and any range matching more than 1000 repos is bisected
+    until each fits. Shards are fetched concurrently under one SearchRateLimiter
+    (`limiter`, or a new one) and their pages are yielded as they arrive,
+    deduplicated by repo id.
+    """
+    print(f"Searching GitHub with sharded query: {query} (sharding on '{shard_field}')")
+    low, high, rest = parse_range_qualifier(query, shard_field)
+    session = create_github_session(pool_size=max_workers)
+    if limiter is None:
+        limiter = SearchRateLimiter()
+    pages = queue.Queue(maxsize=PIPELINE_BUFFER_SIZE)
+    stop = threading.Event()
+    seen_ids = set()
+
+    def emit(page_items):
+        # Blocks while the consumer is behind; returns False once it has gone away
+        while not stop.is_set():
+            try:
+                pages.put(page_items, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def drain():
+        while True:
+            try:
+                page_items = pages.get_nowait()
+            except queue.Empty:
+                return
+            for item in page_items:
+                if item.get("id") not in seen_ids:
+                    seen_ids.add(item.get("id"))
+                    yield item
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        pending = {executor.submit(_fetch_shard, session, limiter, rest, shard_field, low, high, per_page, emit)}
+        while pending:
+            with get_metrics().waiting("search_shards"):
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            yield from drain()
+            for future in done:
+                try:
+                    children = future.result()
+                except requests.exceptions.RequestException as req_err:
+                    print(f"Request error occurred while fetching a shard: {req_err}")
+                    continue
+                except Exception as e:
+                    print(f"An unexpected error occurred while fetching a shard: {e}")
+                    continue
+                for child_low, child_high in children:
+                    pending.add(executor.submit(_fetch_shard, session, limiter, rest, shard_field,
+                                                child_low, child_high, per_page, emit))
+        yield from drain()
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+        session.close()
+    if not seen_ids:
+        print("No repositories found.")
+    else:
+        print(f"Found {len(seen_ids)} repositories.")
+
+
+def get_github_repositories_sharded(query, **kwargs):
+    return list(iter_github_repositories_sharded(query, **kwargs))
+
+
+def iter_github_repositories_multi(queries, stats, known=None, sharded=GITHUB_SEARCH_SHARDED):
+    """
+    Runs every query in `queries` concurrently under one shared
+    SearchRateLimiter and yields each repository once, in arrival order,
+    however many queries match it (deduplicated by repo id).
+
+    Per-query counts are kept in `stats[query]`: "fetched" (results
+    received), "new" (first seen in this run and not in `known`),
+    "known" (first seen in this run but already in `known`, e.g. the
+    registry), "duplicates" (already yielded for another query) and
+    "overlap" ({other query: shared repos}).
+    """
+    limiter = SearchRateLimiter()
+    if sharded:
+        streams = [iter_github_repositories_sharded(query, limiter=limiter) for query in queries]
+    else:
+        streams = [iter_github_repositories(query, limiter=limiter) for query in queries]
+    for query in queries:
+        stats[query] = {"fetched": 0, "new": 0, "known": 0, "duplicates": 0, "overlap": {}}
+    first_query = {} # repo id -> index of the first query that returned it
+    for index, item in merged(streams, name="search_queries"):
+        query_stats = stats[queries[index]]
+        query_stats["fetched"] += 1
+        repo_id = item.get("id")
+        if repo_id in first_query:
+            query_stats["duplicates"] += 1
+            other = queries[first_query[repo_id]]
+            query_stats["overlap"][other] = query_stats["overlap"].get(other, 0) + 1
+            continue
+        first_query[repo_id] = index
+        if known is not None and item.get("html_url") in known:
+            query_stats["known"] += 1
+        else:
+            query_stats["new"] += 1
+        yield item
+
+
+def print_query_stats(stats):
+    # Per-query yield, so queries that only return known repos can be pruned
+    print("Search queries:")
+    for query, query_stats in stats.items():
+        overlap = ", ".join(f"{count} with '{other}'" for other, count in query_stats["overlap"].items())
+        print(f"  - '{query}': {query_stats['fetched']} results, {query_stats['new']} new, "
+              f"{query_stats['known']} already known, {query_stats['duplicates']} duplicates"
+              f"{f' ({overlap})' if overlap else ''}")
+        if not query_stats["new"]:
+            print(f"    This query found nothing new; consider dropping it from GITHUB_SEARCH_QUERIES.")
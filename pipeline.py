@@ -0,0 +1,135 @@
+import queue
+import threading
+from metrics import get_metrics
+from config import PIPELINE_BUFFER_SIZE
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error):
+        self.error = error
+
+
+def _start_producer(iterable, buffer, stop, name, tag=None):
+    """
+    Feeds the items of `iterable` into `buffer` on a daemon thread, followed by
+    _DONE. Items are wrapped as (tag, item) unless `tag` is None. A producer
+    error is passed on as a _StageError. Stops early once `stop` is set.
+    """
+    def put(item):
+        # Give up once the consumer has gone away instead of blocking forever
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item if tag is None else (tag, item)):
+                    break
+        except BaseException as e:
+            put(_StageError(e))
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None and stop.is_set():
+                close()
+            put(_DONE)
+
+    producer = threading.Thread(target=produce, name=f"pipeline-{name}", daemon=True)
+    producer.start()
+    return producer
+
+
+def buffered(iterable, maxsize=PIPELINE_BUFFER_SIZE, name="stage"):
+    """
+    Runs `iterable` on a background thread and yields its items through a queue
+    of at most `maxsize` items, so the producing stage keeps working while the
+    consumer is busy and blocks once the consumer falls `maxsize` items behind.
+    Exceptions raised by the producer are re-raised in the consumer. The
+    producer starts right away, not on the first read. Time the consumer
+    spends waiting on an empty buffer is recorded as "<name>_buffer" in the
+    run metrics.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def consume():
+        metrics = get_metrics()
+        try:
+            while True:
+                try:
+                    item = buffer.get_nowait()
+                except queue.Empty:
+                    with metrics.waiting(f"{name}_buffer"):
+                        item = buffer.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, _StageError):
+                    raise item.error
+                yield item
+        finally:
+            stop.set()
+            producer.join(timeout=5)
+
+    producer = _start_producer(iterable, buffer, stop, name)
+    return consume()
+
+
+def merged(iterables, maxsize=PIPELINE_BUFFER_SIZE, name="merge"):
+    """
+    Runs each of `iterables` on its own background thread and yields
+    (index, item) pairs through one shared queue of at most `maxsize` items,
+    in the order they arrive from any of them. Like buffered(), producers
+    start right away and their exceptions are re-raised in the consumer.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def consume():
+        metrics = get_metrics()
+        remaining = len(producers)
+        try:
+            while remaining:
+                try:
+                    item = buffer.get_nowait()
+                except queue.Empty:
+                    with metrics.waiting(f"{name}_buffer"):
+                        item = buffer.get()
+                if item is _DONE:
+                    remaining -= 1
+                    continue
+                if isinstance(item, _StageError):
+                    raise item.error
+                yield item
+        finally:
+            stop.set()
+            for producer in producers:
+                producer.join(timeout=5)
+
+    producers = [_start_producer(iterable, buffer, stop, f"{name}-{index}", tag=index)
+                 for index, iterable in enumerate(iterables)]
+    return consume()
+
+
+def batched(iterable, size):
+    # Groups items from `iterable` into lists of up to `size` items
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def counted(iterable, counter, key):
+    # Passes items through while counting them in counter[key]
+    for item in iterable:
+        counter[key] = counter.get(key, 0) + 1
+        yield item
@@ -0,0 +1,464 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from config import (REGISTRY_DB_FILE, OWNED_REPOS_FILE, REJECTED_REPOS_FILE, SWE_BENCH_BLACKLIST_FILE,
+                    SWE_BENCH_GREEN_LIST_FILE)
+
+# Repo statuses. An owned repo stays owned whatever verdict it gets later.
+STATUS_OWNED = "owned"
+STATUS_REJECTED_PYTHON = "rejected_python"
+STATUS_REJECTED_PREFILTER = "rejected_prefilter" # data["rejected_by"] names the filter
+STATUS_SWE_FAILED = "swe_failed"
+STATUS_SWE_PASSED = "swe_passed"
+# Stage results of the separate CLI stages (see run.py): found by `search` and
+# waiting for `filter-python`, or passed it and waiting for `check-swe-bench`
+STATUS_FOUND = "found"
+STATUS_PASSED_FILTERS = "passed_filters"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    url TEXT PRIMARY KEY,
+    repo_id INTEGER,
+    full_name TEXT,
+    status TEXT NOT NULL,
+    pushed_at TEXT,
+    stars INTEGER,
+    first_seen REAL NOT NULL,
+    verdict_at REAL NOT NULL,
+    data TEXT,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS repos_status ON repos (status, pushed_at, stars);
+CREATE INDEX IF NOT EXISTS repos_repo_id ON repos (repo_id);
+CREATE INDEX IF NOT EXISTS repos_first_seen ON repos (first_seen);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    query TEXT,
+    started_at REAL NOT NULL,
+    search_done INTEGER NOT NULL DEFAULT 0,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS run_queue (
+    run_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    queued_at REAL NOT NULL,
+    data TEXT,
+    PRIMARY KEY (run_id, url)
+);
+CREATE TABLE IF NOT EXISTS filter_stats (
+    name TEXT PRIMARY KEY,
+    evaluated INTEGER NOT NULL DEFAULT 0,
+    passed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class RepoRegistry:
+    """
+    Single SQLite store for every repo the pipeline knows about: owned repos,
+    repos rejected by the Python-percentage filter and repos that failed or
+    passed the SWE-Bench check. One row per repo url, indexed by status.
+
+    The legacy JSON list files are imported once when the database is created
+    and can be regenerated from it with export_json / export_all_json.
+    """
+
+    def __init__(self, path=REGISTRY_DB_FILE):
+        self.path = path
+        # Stages run on several threads; all access goes through one connection and lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # With WAL, NORMAL still survives a crash or Ctrl-C of the process and
+            # keeps one commit per verdict cheap
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+        if self._get_meta("legacy_imported") is None:
+            self.import_legacy_json()
+        if self._get_meta("filter_stats_seeded") is None:
+            self._seed_filter_stats()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _migrate(self):
+        # Registries created before repos had a version column
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(repos)")}
+        if "version" not in columns:
+            self._conn.execute("ALTER TABLE repos ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("DROP INDEX IF EXISTS repos_verdict_at")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS repos_version ON repos (version)")
+
+    def _begin_version(self):
+        """
+        Opens a write transaction and returns the version for the rows it
+        changes: one more than any committed so far. Writers take the lock in
+        turn, so versions grow in commit order and a reader never sees a
+        version committed after a higher one (see changed_since).
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM repos").fetchone()[0]
+
+    def _get_meta(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_meta(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def __contains__(self, url):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM repos WHERE url = ?", (url,)).fetchone() is not None
+
+    def status_of(self, url):
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM repos WHERE url = ?", (url,)).fetchone()
+        return row["status"] if row else None
+
+    def count(self, status=None):
+        with self._lock:
+            if status is None:
+                return self._conn.execute("SELECT COUNT(*) FROM repos").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM repos WHERE status = ?", (status,)).fetchone()[0]
+
+    def requeue_prefilter_rejects(self, prefilter_config):
+        """
+        Moves every pre-filter reject back to STATUS_FOUND, for the filters to
+        evaluate again, if `prefilter_config` (see filters.prefilter_config)
+        differs from the config they were rejected under. Rejects from before
+        the config was stored count as rejected under a different one.
+        Returns how many repos were moved.
+        """
+        if self._get_meta("prefilter_config") == prefilter_config:
+            return 0
+        with self._lock:
+            rows = self._conn.execute("SELECT url, data FROM repos WHERE status = ?",
+                                      (STATUS_REJECTED_PREFILTER,)).fetchall()
+        repos = []
+        for row in rows:
+            repo = json.loads(row["data"]) if row["data"] else {"html_url": row["url"]}
+            repo.pop("rejected_by", None)
+            repos.append(repo)
+        self.record_verdicts((repo, STATUS_FOUND) for repo in repos)
+        self._set_meta("prefilter_config", prefilter_config)
+        return len(repos)
+
+    def counts(self):
+        # {status: number of repos}
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM repos GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def urls(self, status):
+        with self._lock:
+            return [row["url"] for row in self._conn.execute("SELECT url FROM repos WHERE status = ?", (status,))]
+
+    def urls_since(self, first_seen=None, page_size=10000):
+        """
+        Yields the url of every repo first seen after `first_seen` (all repos
+        if None), reading them page by page so no lock is held in between.
+        """
+        if first_seen is not None:
+            with self._lock:
+                rows = self._conn.execute("SELECT url FROM repos WHERE first_seen > ?", (first_seen,)).fetchall()
+            yield from (row["url"] for row in rows)
+            return
+        last_url = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute("SELECT url FROM repos WHERE url > ? ORDER BY url LIMIT ?",
+                                          (last_url, page_size)).fetchall()
+            if not rows:
+                return
+            yield from (row["url"] for row in rows)
+            last_url = rows[-1]["url"]
+
+    def deleted_at(self):
+        # When repos were last deleted, so indexes built before then know they are stale
+        value = self._get_meta("repos_deleted_at")
+        return float(value) if value is not None else None
+
+    def repos(self, status):
+        """
+        Returns the stored repo dicts with `status`, newest push first and then
+        most stars, the order the green list has always been saved in.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, data FROM repos WHERE status = ? ORDER BY pushed_at DESC, stars DESC",
+                (status,)).fetchall()
+        return [json.loads(row["data"]) if row["data"] else {"html_url": row["url"]} for row in rows]
+
+    def version(self):
+        # The version of the latest committed change; read it before the changes it should cover
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(version), 0) FROM repos").fetchone()[0]
+
+    def changed_since(self, version):
+        # Returns (repo, status) for every repo whose verdict was recorded after `version` (see version())
+        with self._lock:
+            rows = self._conn.execute("SELECT url, status, data FROM repos WHERE version > ?",
+                                      (version,)).fetchall()
+        return [(json.loads(row["data"]) if row["data"] else {"html_url": row["url"]}, row["status"])
+                for row in rows]
+
+    def record_verdicts(self, verdicts):
+        """
+        Upserts (repo, status) pairs in one transaction. `repo` is either a
+        cleaned repo dict or a bare html_url. Owned repos keep their status.
+        """
+        now = time.time()
+        rows = []
+        for repo, status in verdicts:
+            if isinstance(repo, str):
+                repo = {"html_url": repo}
+            url = repo.get("html_url")
+            if not url:
+                continue
+            data = json.dumps(repo, ensure_ascii=False) if len(repo) > 1 else None
+            rows.append((url, repo.get("id"), repo.get("full_name"), status, repo.get("pushed_at"),
+                         repo.get("stars"), now, now, data))
+        if not rows:
+            return
+        with self._lock, self._conn:
+            version = self._begin_version()
+            self._conn.executemany("""
+                INSERT INTO repos (url, repo_id, full_name, status, pushed_at, stars, first_seen, verdict_at, data,
+                                   version)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET
+                    repo_id = COALESCE(excluded.repo_id, repo_id),
+                    full_name = COALESCE(excluded.full_name, full_name),
+                    status = CASE WHEN status = 'owned' THEN status ELSE excluded.status END,
+                    pushed_at = COALESCE(excluded.pushed_at, pushed_at),
+                    stars = COALESCE(excluded.stars, stars),
+                    verdict_at = excluded.verdict_at,
+                    data = COALESCE(excluded.data, data),
+                    version = excluded.version
+            """, [row + (version,) for row in rows])
+
+    def record_verdict(self, repo, status):
+        self.record_verdicts([(repo, status)])
+
+    def expired(self, ttl_days, limit):
+        """
+        Returns up to `limit` (repo, status) pairs whose verdict is older than
+        the TTL of its status (`ttl_days`: {status: days or None}), most
+        promising first: latest push, then most stars, then oldest verdict.
+        Owned repos never expire.
+        """
+        now = time.time()
+        clauses, params = [], []
+        for status, days in ttl_days.items():
+            if days is not None and status != STATUS_OWNED:
+                clauses.append("(status = ? AND verdict_at < ?)")
+                params += [status, now - days * 86400]
+        if not clauses or limit <= 0:
+            return []
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT url, full_name, status, data FROM repos WHERE {" OR ".join(clauses)}
+                ORDER BY pushed_at DESC, stars DESC, verdict_at ASC LIMIT ?
+            """, params + [limit]).fetchall()
+        expired = []
+        for row in rows:
+            repo = json.loads(row["data"]) if row["data"] else {"html_url": row["url"]}
+            # Rows imported from the legacy url lists only know the url
+            repo.setdefault("full_name", row["full_name"] or row["url"].rstrip("/").split("github.com/")[-1])
+            expired.append((repo, row["status"]))
+        return expired
+
+    def filter_stats(self):
+        # {filter name: (repos evaluated, repos passed)} over every run so far
+        with self._lock:
+            rows = self._conn.execute("SELECT name, evaluated, passed FROM filter_stats").fetchall()
+        return {row["name"]: (row["evaluated"], row["passed"]) for row in rows}
+
+    def record_filter_stats(self, stats):
+        # Adds one run's {name: {"evaluated": n, "passed": m}} counts to the totals
+        rows = [(name, counts.get("evaluated", 0), counts.get("passed", 0)) for name, counts in stats.items()
+                if counts.get("evaluated")]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                INSERT INTO filter_stats (name, evaluated, passed) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET evaluated = evaluated + excluded.evaluated,
+                                                 passed = passed + excluded.passed
+            """, rows)
+
+    def _seed_filter_stats(self):
+        # Start the filter statistics from the verdicts recorded before they were kept
+        reached_swe_bench = self.count(STATUS_SWE_FAILED) + self.count(STATUS_SWE_PASSED)
+        self.record_filter_stats({
+            "python_percentage": {"evaluated": reached_swe_bench + self.count(STATUS_REJECTED_PYTHON),
+                                  "passed": reached_swe_bench},
+            "swe_bench": {"evaluated": reached_swe_bench, "passed": self.count(STATUS_SWE_PASSED)},
+        })
+        self._set_meta("filter_stats_seeded", str(time.time()))
+
+    def start_run(self, query):
+        with self._lock, self._conn:
+            return self._conn.execute("INSERT INTO runs (query, started_at) VALUES (?, ?)",
+                                      (query, time.time())).lastrowid
+
+    def recent_runs(self, limit=5):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def last_unfinished_run(self):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM runs WHERE finished_at IS NULL ORDER BY id DESC LIMIT 1").fetchone()
+        return dict(row) if row else None
+
+    def mark_search_done(self, run_id):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE runs SET search_done = 1 WHERE id = ?", (run_id,))
+
+    def finish_run(self, run_id):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE runs SET finished_at = ? WHERE id = ?", (time.time(), run_id))
+            self._conn.execute("DELETE FROM run_queue WHERE run_id = ?", (run_id,))
+
+    def enqueue(self, run_id, repo):
+        # Durably remember that `repo` is waiting for the SWE-Bench stage of run_id
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO run_queue (run_id, url, queued_at, data) VALUES (?, ?, ?, ?)",
+                               (run_id, repo["html_url"], time.time(), json.dumps(repo, ensure_ascii=False)))
+
+    def pending(self, run_id):
+        """
+        Returns the queued repos of run_id that have no verdict yet, or only one
+        from before they were queued (a revalidation), in the order they were
+        queued.
+        """
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT q.data FROM run_queue q LEFT JOIN repos r ON r.url = q.url
+                WHERE q.run_id = ? AND (r.url IS NULL OR r.verdict_at < q.queued_at) ORDER BY q.queued_at
+            """, (run_id,)).fetchall()
+        return [json.loads(row["data"]) for row in rows]
+
+    def sync_owned(self, file_path=OWNED_REPOS_FILE):
+        """
+        Mirrors the owned repo list file into the registry. The file is only
+        re-read when its modification time has changed since the last sync.
+        """
+        try:
+            mtime = str(os.path.getmtime(file_path))
+        except OSError:
+            print(f"Info: '{file_path}' not found. Keeping {self.count(STATUS_OWNED)} owned repos from the registry.")
+            return
+        if self._get_meta(f"synced_mtime:{file_path}") == mtime:
+            return
+        owned_urls = _load_json_list(file_path)
+        now = time.time()
+        with self._lock, self._conn:
+            version = self._begin_version()
+            self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS owned_sync (url TEXT PRIMARY KEY)")
+            self._conn.execute("DELETE FROM owned_sync")
+            self._conn.executemany("INSERT OR IGNORE INTO owned_sync (url) VALUES (?)",
+                                   ((url,) for url in owned_urls if isinstance(url, str)))
+            # Repos dropped from the owned list no longer have a verdict of their own
+            deleted = self._conn.execute(
+                "DELETE FROM repos WHERE status = 'owned' AND url NOT IN (SELECT url FROM owned_sync)").rowcount
+            self._conn.execute("""
+                INSERT INTO repos (url, status, first_seen, verdict_at, version)
+                SELECT url, 'owned', ?, ?, ? FROM owned_sync WHERE true
+                ON CONFLICT (url) DO UPDATE SET status = 'owned',
+                    verdict_at = CASE WHEN status = 'owned' THEN verdict_at ELSE excluded.verdict_at END,
+                    version = CASE WHEN status = 'owned' THEN version ELSE excluded.version END
+            """, (now, now, version))
+        if deleted:
+            self._set_meta("repos_deleted_at", str(time.time()))
+        self._set_meta(f"synced_mtime:{file_path}", mtime)
+        print(f"Synced {self.count(STATUS_OWNED)} owned repos from '{file_path}' into the registry.")
+
+    def import_legacy_json(self):
+        # One-time migration from the JSON list files the pipeline used to keep
+        verdicts = [(url, STATUS_REJECTED_PYTHON) for url in _load_json_list(REJECTED_REPOS_FILE)]
+        verdicts += [(url, STATUS_SWE_FAILED) for url in _load_json_list(SWE_BENCH_BLACKLIST_FILE)]
+        verdicts += [(repo, STATUS_SWE_PASSED) for repo in _load_json_list(SWE_BENCH_GREEN_LIST_FILE)]
+        self.record_verdicts(verdict for verdict in verdicts if isinstance(verdict[0], (str, dict)))
+        self._set_meta("legacy_imported", str(time.time()))
+        if verdicts:
+            print(f"Imported {len(verdicts)} repo verdicts from the legacy JSON files into '{self.path}'.")
+        self.sync_owned()
+
+    def export_json(self, status, file_path):
+        """
+        Writes the repos with `status` to `file_path` in the legacy format: repo
+        objects for the green list, plain html_url lists for everything else.
+        """
+        data = self.repos(status) if status == STATUS_SWE_PASSED else self.urls(status)
+        atomic_write_json(file_path, data)
+        return data
+
+    def export_all_json(self):
+        self.export_json(STATUS_REJECTED_PYTHON, REJECTED_REPOS_FILE)
+        self.export_json(STATUS_SWE_FAILED, SWE_BENCH_BLACKLIST_FILE)
+        return self.export_json(STATUS_SWE_PASSED, SWE_BENCH_GREEN_LIST_FILE)
+
+
+@contextmanager
+def atomic_open(file_path, mode="w", fsync=False):
+    """
+    Yields a temporary file next to `file_path` to write and moves it over
+    `file_path` once the block completes, so readers never see a
+    half-written file. With `fsync` its data reaches the disk before the
+    move. If the block fails, `file_path` is left as it was.
+    """
+    tmp_path = f"{file_path}.tmp"
+    try:
+        with open(tmp_path, mode, encoding=None if "b" in mode else "utf-8") as f:
+            yield f
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, file_path)
+
+
+def atomic_write_json(file_path, data, indent=2):
+    with atomic_open(file_path) as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+
+
+def _load_json_list(file_path):
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        data = json.loads(content) if content.strip() else []
+    except FileNotFoundError:
+        return []
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"Warning: Could not read '{file_path}': {e}. Treating it as empty.")
+        return []
+    if not isinstance(data, list):
+        print(f"Warning: '{file_path}' does not contain a JSON list. Treating it as empty.")
+        return []
+    return data
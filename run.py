@@ -1,145 +1,565 @@
-import json
+"""
+Command line entry point. Every stage reads its input from and writes its
+output to the registry, so the stages can also be run one at a time (e.g. from
+separate cron jobs):
+
+    python run.py search             GitHub search -> repos recorded as "found"
+    python run.py filter-python      "found" -> pre-filters and Python % -> "passed_filters"
+    python run.py check-swe-bench    "passed_filters" -> SWE-Bench check -> "swe_passed" / "swe_failed"
+    python run.py merge              work-queue verdicts -> registry -> green list
+    python run.py stats              registry, filter and work-queue counts
+    python run.py [run] [--resume]   all of the above in one streaming pipeline (the default)
+
+Modules that pull in requests, BeautifulSoup or lxml (pagination, FilterRepo,
+http_cache) are imported by the commands that use them, so `stats` and
+`merge` start without them.
+"""
+import argparse
 import os
-from datetime import datetime, timezone
-from pagination import get_github_repositories
-from FilterRepo import (Filterby_Python_percentage, Load_repos, cleaned_repos,
-                        filter_by_swe_bench_batches)
-from config import (OWNED_REPOS_FILE, FILTERED_REPOS_FILE, REJECTED_REPOS_FILE,
-                    SWE_BENCH_GREEN_LIST_FILE, SWE_BENCH_BLACKLIST_FILE,
-                    get_github_header, get_swe_bench_header)
-
-def run_filter_pipeline():
-    # Load all owned repository URLs
-    owned_repo_urls = Load_repos(OWNED_REPOS_FILE)
-    rejected_by_python_urls = Load_repos(REJECTED_REPOS_FILE)
-    failed_swe_bench_urls = Load_repos(SWE_BENCH_BLACKLIST_FILE)
-
-    # Load repos that previously passed ALL filters (are in the current green list)
-    # These should also not be re-fetched from GitHub.
-    # SWE_BENCH_GREEN_LIST_FILE stores full repo objects, Load_repos extracts html_url
-    previously_passed_all_urls = Load_repos(SWE_BENCH_GREEN_LIST_FILE)
-
-    # Combine all URLs to ignore for the initial GitHub fetch
-    # These are repos we definitely don't want to query GitHub for again if they've been fully processed or blacklisted.
-    ignore_for_github_fetch = owned_repo_urls.union(rejected_by_python_urls) \
-                                           .union(failed_swe_bench_urls) \
-                                           .union(previously_passed_all_urls)
-
-    print(f"Initializing... Will ignore {len(ignore_for_github_fetch)} URLs for new GitHub fetch.")
+import shutil
+import sys
+import time
+from itertools import chain
+from metrics import get_metrics, reset_metrics, write_json_report, write_prometheus_textfile
+from pipeline import batched, buffered, counted
+from filters import RepoFilter, KIND_API, KIND_SCRAPE, local_filters, plan_filters, apply_filters, prefilter_config
+from membership import MembershipIndex
+from green_list import GreenList
+from scheduler import SharedTokenBucketScheduler
+from work_queue import LeaseQueue, default_worker_id
+from registry import (RepoRegistry, STATUS_OWNED, STATUS_REJECTED_PYTHON, STATUS_REJECTED_PREFILTER,
+                      STATUS_SWE_FAILED, STATUS_SWE_PASSED, STATUS_FOUND, STATUS_PASSED_FILTERS)
+from config import (OWNED_REPOS_FILE, FILTERED_REPOS_FILE, SWE_BENCH_GREEN_LIST_FILE, SWE_BENCH_GREEN_LIST_NDJSON,
+                    ENABLE_PYTHON_PERCENTAGE_FILTER, GITHUB_SEARCH_QUERIES, EXPORT_GREEN_LIST_JSON,
+                    METRICS_REPORT_FILE, METRICS_PROMETHEUS_FILE, FILTER_COST_PYTHON_PERCENTAGE,
+                    FILTER_PRIOR_SELECTIVITY, SWE_BENCH_REQUESTS_PER_MINUTE, VERDICT_TTL_DAYS, REVALIDATION_BUDGET,
+                    WORK_QUEUE_DB_FILE, REJECTED_REPOS_FILE, SWE_BENCH_BLACKLIST_FILE, get_github_header, get_swe_bench_header)
 
-    # Fetch new repositories from GitHub
-    # (Adjust query and pagination settings in pagination.py or here as needed)
-    github_query = 'language:Python stars:>500 pushed:>2024-11-01'
-    print(f"\nFetching new repositories from GitHub with query: {github_query}")
-    try:
-        new_github_items = get_github_repositories(github_query)
-    except ImportError:
-        print("Error: pagination.py or get_github_repositories function not found. Please ensure it's correctly defined.")
-        new_github_items = [] # Default to empty list if pagination fails
+# Verdicts re-checked by the filters (every expiring status but SWE-Bench failures) and by the SWE-Bench check
+FILTER_TTL_DAYS = {status: days for status, days in VERDICT_TTL_DAYS.items() if status != STATUS_SWE_FAILED}
+SWE_BENCH_TTL_DAYS = {STATUS_SWE_FAILED: VERDICT_TTL_DAYS.get(STATUS_SWE_FAILED)}
+
+
+def save_green_list(registry, export_json=EXPORT_GREEN_LIST_JSON):
+    """
+    Brings the NDJSON green list up to date with the registry. With
+    `export_json`, also regenerates the legacy JSON files from the registry:
+    the green list (SWE_BENCH_GREEN_LIST_FILE and FILTERED_REPOS_FILE, a copy
+    of it), REJECTED_REPOS_FILE and SWE_BENCH_BLACKLIST_FILE.
+    """
+    green_list = GreenList()
+    added, removed = green_list.update(registry)
+    print(f"\nGreen list {SWE_BENCH_GREEN_LIST_NDJSON}: {added} added, {removed} removed, {len(green_list)} repos.")
+    if export_json:
+        exported = registry.export_all_json()
+        print(f"Saved {len(exported)} repos to the final green list: {SWE_BENCH_GREEN_LIST_FILE}")
+        print(f"Exported the rejected and SWE-Bench failed repos to {REJECTED_REPOS_FILE} and "
+              f"{SWE_BENCH_BLACKLIST_FILE}.")
+        shutil.copyfile(SWE_BENCH_GREEN_LIST_FILE, FILTERED_REPOS_FILE)
+        print(f"Updated {FILTERED_REPOS_FILE} to match the final green list.")
+
+
+def search_completed(registry, run_id):
+    # Empty generator chained after the last queued repo: from here on every
+    # candidate of the run is either decided or in the run queue
+    registry.mark_search_done(run_id)
+    yield from ()
+
+
+def queued(repos, registry, run_id):
+    # Records each repo in the run queue before it enters the SWE-Bench stage
+    for repo in repos:
+        registry.enqueue(run_id, repo)
+        yield repo
+
+
+def recorded(repos, registry, status, batch_size=100):
+    # Records every repo passing through as `status`, one transaction per batch
+    for batch in batched(repos, batch_size):
+        registry.record_verdicts((repo, status) for repo in batch)
+        yield from batch
+
+
+def collect_verdicts(registry, work_queue):
+    # Moves the verdicts recorded by queue workers into the registry
+    verdicts = work_queue.finished()
+    if not verdicts:
+        return 0
+    registry.record_verdicts(verdicts)
+    passed = sum(status == STATUS_SWE_PASSED for _, status in verdicts)
+    registry.record_filter_stats({"swe_bench": {"evaluated": len(verdicts), "passed": passed}})
+    work_queue.remove(repo["html_url"] for repo, _ in verdicts)
+    print(f"Collected {len(verdicts)} SWE-Bench verdicts from the work queue ({passed} passed).")
+    return len(verdicts)
+
+
+def write_run_report(metrics, stage_counts, query_stats=None):
+    # Writes the run report files and cProfile dumps; returns the report
+    from http_cache import get_default_cache
+    metrics.finish()
+    report = metrics.report(cache=get_default_cache(), counts=stage_counts)
+    if query_stats:
+        report["queries"] = query_stats
+    if METRICS_REPORT_FILE:
+        write_json_report(METRICS_REPORT_FILE, report)
+        print(f"Run report written to {METRICS_REPORT_FILE}")
+    if METRICS_PROMETHEUS_FILE:
+        write_prometheus_textfile(METRICS_PROMETHEUS_FILE, report)
+        print(f"Prometheus metrics written to {METRICS_PROMETHEUS_FILE}")
+    for stage, path in metrics.write_profiles().items():
+        print(f"cProfile of stage '{stage}' written to {path}")
+    return report
+
+
+def print_run_report(report):
+    print(f"Time ({report['wall_seconds']:.0f}s wall; busy time excludes waiting on other stages):")
+    for stage, entry in report["stages"].items():
+        print(f"  - {stage}: {entry['busy_seconds']:.1f}s busy, {entry['items']} items")
+    for endpoint, entry in report["endpoints"].items():
+        print(f"  - {endpoint} requests: {entry['requests']} ({entry['retries']} retries), "
+              f"{entry['seconds']:.1f}s waiting on the server")
+    print(f"  - Sleeping on rate limits and pacing: {report['time']['sleep_seconds']:.1f}s")
+
+
+def requeue_prefilter_rejects(registry):
+    # Pre-filter rejects depend on the PREFILTER_* settings; when they change, the filters see the rejects again
+    requeued = registry.requeue_prefilter_rejects(prefilter_config())
+    if requeued:
+        print(f"Pre-filter settings changed: {requeued} pre-filter rejects go through the filters again.")
+
+
+def build_filter_plan(registry, python_percentage_stage):
+    """
+    Declares the filter chain (cheap pre-filters, the Python percentage check
+    through `python_percentage_stage` if enabled, and the SWE-Bench check)
+    and orders it with the pass rates of earlier runs.
+    """
+    filters = local_filters()
+    if ENABLE_PYTHON_PERCENTAGE_FILTER:
+        filters.append(RepoFilter("python_percentage", KIND_API, FILTER_COST_PYTHON_PERCENTAGE,
+                                  FILTER_PRIOR_SELECTIVITY["python_percentage"], stage=python_percentage_stage))
+    filters.append(RepoFilter("swe_bench", KIND_SCRAPE, 60 / SWE_BENCH_REQUESTS_PER_MINUTE,
+                              FILTER_PRIOR_SELECTIVITY["swe_bench"]))
+    planned = plan_filters(filters, registry.filter_stats())
+    print("Filter plan:")
+    for repo_filter in planned:
+        print(f"  - {repo_filter}")
+    return planned
+
+
+def python_percentage_stage_for(registry, stage_counts):
+    # The Python percentage filter's stage: a buffered, counted iter_python_percentage
+    from FilterRepo import iter_python_percentage
+    metrics = get_metrics()
+    github_headers = get_github_header() if ENABLE_PYTHON_PERCENTAGE_FILTER else None
+
+    def python_percentage_stage(repos):
+        python_percentage = iter_python_percentage(repos, github_headers, registry=registry)
+        return buffered(counted(metrics.timed(python_percentage, "python_percentage"), stage_counts, "passed_python"),
+                        name="python_percentage")
+
+    return python_percentage_stage
+
+
+def run_filter_pipeline(resume=False, enqueue=False, export_json=EXPORT_GREEN_LIST_JSON):
+    """
+    Runs search -> clean -> Python percentage -> SWE-Bench check. Repos left
+    as "found" or "passed_filters" by the separate stage commands join the
+    stream at the filters and at the SWE-Bench check respectively.
+
+    With `enqueue`, the repos that reach the SWE-Bench check are added to the
+    work queue (WORK_QUEUE_DB_FILE) for run_swe_bench_worker processes
+    instead, and the verdicts the workers have finished so far are collected
+    into the registry first.
+
+    The green list is saved incrementally as NDJSON (see save_green_list);
+    with `export_json` it is also written out as indented JSON.
 
-    github_api_results = {'items': new_github_items}
-    print(f"Fetched {len(new_github_items)} new items from GitHub API.")
+    Every verdict is committed to the registry as soon as it is known, and
+    every repo waiting for the SWE-Bench check is recorded in the run queue.
+    With `resume`, the last interrupted run is continued: its queued repos
+    without a verdict are checked first, and the search is only repeated if
+    it had not completed.
+
+    Verdicts older than their VERDICT_TTL_DAYS are re-checked, at most
+    REVALIDATION_BUDGET of them per run: Python-percentage rejects go through
+    the filter chain again, SWE-Bench failures straight to the SWE-Bench check.
+
+    Stage timings, requests and rate-limit usage are collected in the run
+    metrics and written out as described by METRICS_REPORT_FILE and
+    METRICS_PROMETHEUS_FILE.
+    """
+    from pagination import iter_github_repositories_multi, print_query_stats
+    from FilterRepo import iter_cleaned_repos, iter_swe_bench_batches
+    from http_cache import get_default_cache
+    metrics = reset_metrics()
+    # Every repo in the registry (owned, rejected, failed or already passed) is
+    # ignored for the new GitHub fetch. Membership checks go to a compact index
+    # of its repo keys, loaded on the first search result.
+    registry = RepoRegistry()
+    with metrics.stage("sync_owned"):
+        registry.sync_owned(OWNED_REPOS_FILE)
+    known_repos = MembershipIndex(registry)
+    work_queue = LeaseQueue() if enqueue else None
+    if work_queue is not None:
+        collect_verdicts(registry, work_queue)
+
+    github_queries = GITHUB_SEARCH_QUERIES
+    interrupted_run = registry.last_unfinished_run() if resume else None
+    if interrupted_run is not None:
+        run_id = interrupted_run["id"]
+        pending_repos = registry.pending(run_id)
+        search_needed = not interrupted_run["search_done"]
+        print(f"Resuming run {run_id}: {len(pending_repos)} queued repos still need a SWE-Bench verdict"
+              f"{'' if search_needed else ', search already complete'}.")
+    else:
+        if resume:
+            print("No interrupted run to resume. Starting a new run.")
+        run_id = registry.start_run("; ".join(github_queries))
+        pending_repos = []
+        search_needed = True
+
+    print(f"Initializing... Will ignore {registry.count()} URLs for new GitHub fetch.")
+
+    # Spend the revalidation budget on the most promising expired verdicts
+    pending_urls = {repo["html_url"] for repo in pending_repos}
+    revalidating = [(repo, status) for repo, status in registry.expired(VERDICT_TTL_DAYS, REVALIDATION_BUDGET)
+                    if repo["html_url"] not in pending_urls]
+    recheck_filters = [repo for repo, status in revalidating if status != STATUS_SWE_FAILED]
+    recheck_swe_bench = [repo for repo, status in revalidating if status == STATUS_SWE_FAILED]
+    if revalidating:
+        print(f"Revalidating {len(revalidating)} expired verdicts ({len(recheck_filters)} through the filters, "
+              f"{len(recheck_swe_bench)} SWE-Bench failures).")
+
+    # Repos left half-way by the separate stage commands
+    requeue_prefilter_rejects(registry)
+    staged_found = registry.repos(STATUS_FOUND)
+    staged_passed = [repo for repo in registry.repos(STATUS_PASSED_FILTERS) if repo["html_url"] not in pending_urls
+                     and (work_queue is None or repo["html_url"] not in work_queue)]
+    if staged_found or staged_passed:
+        print(f"Picking up {len(staged_found)} found repos for the filters and {len(staged_passed)} repos "
+              f"that passed them for the SWE-Bench check.")
+
+    # The stages below are chained generators. Search pages and Python
+    # percentage results are produced on background threads into bounded
+    # buffers, so the SWE-Bench stage starts as soon as the first repos arrive.
+    stage_counts = {}
+
+    # Fetch new repositories from GitHub
+    # (Adjust the queries in GITHUB_SEARCH_QUERIES and pagination settings in config.py)
+    query_stats = {}
+    if search_needed:
+        print(f"\nFetching new repositories from GitHub with {len(github_queries)} queries: "
+              f"{'; '.join(github_queries)}")
+        new_github_items = iter_github_repositories_multi(github_queries, query_stats, known=known_repos)
+    else:
+        new_github_items = iter(())
+    if pending_repos:
+        # Queued repos are checked first; don't let the search hand them over a second time
+        new_github_items = (item for item in new_github_items if item.get("html_url") not in pending_urls)
+    if work_queue is not None:
+        # Repos still in the work queue have no verdict in the registry yet
+        new_github_items = (item for item in new_github_items if item.get("html_url") not in work_queue)
+    new_github_items = buffered(counted(metrics.timed(new_github_items, "search"), stage_counts, "fetched"),
+                                name="search")
 
     # Clean newly fetched GitHub repos
-    newly_cleaned_github_repos = cleaned_repos(ignore_for_github_fetch, github_api_results)
-    print(f"Cleaned {len(newly_cleaned_github_repos)} new GitHub repos (after initial ignore).")
+    newly_cleaned_github_repos = counted(metrics.timed(iter_cleaned_repos(known_repos, new_github_items), "clean"),
+                                         stage_counts, "cleaned")
 
-    # # Filter by Python Percentage
-    # github_headers = get_github_header()
-    # passed_python_filter = Filterby_Python_percentage(newly_cleaned_github_repos, github_headers)
-    # print(f"{len(passed_python_filter)} repos passed Python percentage filter.")
+    # Cheap pre-filters and the Python percentage check, cheapest and most selective first
+    planned_filters = build_filter_plan(registry, python_percentage_stage_for(registry, stage_counts))
+    filter_stats = {}
+    passed_python_filter = apply_filters(chain(recheck_filters, staged_found, newly_cleaned_github_repos),
+                                         planned_filters, filter_stats, registry)
 
     # Filter by SWE-Bench Batches
-    repos_for_swe_bench_check = [
-        repo for repo in newly_cleaned_github_repos
-        if repo.get("html_url") not in failed_swe_bench_urls and repo.get("html_url") not in owned_repo_urls
-    ]
-
     swe_bench_base_headers = get_swe_bench_header(include_user_agent=False) # Get auth headers without UA initially
-    # filter_by_swe_bench_batches updates SWE_BENCH_BLACKLIST_FILE internally
-    newly_passed_swe_bench = filter_by_swe_bench_batches(repos_for_swe_bench_check, swe_bench_base_headers)
-    print(f"{len(newly_passed_swe_bench)} new repos passed SWE-Bench batch check.")
-
-    # Combine and Finalize Green List
-    # Start with repos that previously passed all filters and are still valid (not owned)
-    final_green_list = []
-    if os.path.exists(SWE_BENCH_GREEN_LIST_FILE):
-        try:
-            with open(SWE_BENCH_GREEN_LIST_FILE, "r", encoding="utf-8") as f:
-                final_green_list = json.load(f)
-            # Ensure these are not in owned_repo_urls now
-            final_green_list = [repo for repo in final_green_list if repo.get("html_url") not in owned_repo_urls]
-        except Exception as e:
-            print(f"Error loading {SWE_BENCH_GREEN_LIST_FILE}: {e}")
-            final_green_list = []
-
-    # Add newly passed repos
-    final_green_list.extend(newly_passed_swe_bench)
-
-    # Deduplicate the final list based on 'html_url'
-    seen_urls = set()
-    deduplicated_green_list = []
-    for repo in final_green_list:
-        url = repo.get("html_url")
-        if url and url not in seen_urls:
-            deduplicated_green_list.append(repo)
-            seen_urls.add(url)
-
-    # Sort the final green list
-    def sort_key(repo_item):
-        pushed_at_str = repo_item.get('pushed_at')
-        try:
-            pushed_at_dt = datetime.fromisoformat(pushed_at_str.replace('Z', '+00:00')) if pushed_at_str else datetime.min.replace(tzinfo=timezone.utc)
-        except (ValueError, AttributeError):
-            pushed_at_dt = datetime.min.replace(tzinfo=timezone.utc)
-        stars_count = repo_item.get('stars', 0)
-        stars_count = stars_count if stars_count is not None else 0
-        return (pushed_at_dt, stars_count)
-
-    deduplicated_green_list.sort(key=sort_key, reverse=True)
+    # iter_swe_bench_batches records every verdict in the registry
+    repos_for_swe_bench_check = counted(chain(pending_repos,
+                                              queued(chain(recheck_swe_bench, staged_passed, passed_python_filter),
+                                                     registry, run_id),
+                                              search_completed(registry, run_id)),
+                                        filter_stats.setdefault("swe_bench", {}), "evaluated")
+    newly_passed_swe_bench = 0
+    try:
+        if work_queue is not None:
+            enqueued = work_queue.enqueue(metrics.timed(repos_for_swe_bench_check, "enqueue"))
+        else:
+            swe_bench = iter_swe_bench_batches(repos_for_swe_bench_check, swe_bench_base_headers, registry=registry)
+            for _ in metrics.timed(swe_bench, "swe_bench"):
+                newly_passed_swe_bench += 1
+    except KeyboardInterrupt:
+        print(f"\nInterrupted. All verdicts so far are saved; run 'python run.py --resume' to continue run {run_id}.")
+        # No filter statistics: repos still in the buffers would count as rejects now and again on --resume
+        write_run_report(metrics, stage_counts, query_stats)
+        raise
+    if work_queue is not None:
+        # collect_verdicts records the SWE-Bench statistics
+        filter_stats.pop("swe_bench")
+    else:
+        filter_stats["swe_bench"]["passed"] = newly_passed_swe_bench
+    registry.record_filter_stats(filter_stats)
+    registry.finish_run(run_id)
 
-    # Save the final green list
-    with open(SWE_BENCH_GREEN_LIST_FILE, "w", encoding="utf-8") as out:
-        json.dump(deduplicated_green_list, out, indent=2, ensure_ascii=False)
-    print(f"\nSaved {len(deduplicated_green_list)} repos to the final green list: {SWE_BENCH_GREEN_LIST_FILE}")
+    print(f"Fetched {stage_counts.get('fetched', 0)} new items from GitHub API.")
+    if query_stats:
+        print_query_stats(query_stats)
+    print(f"Cleaned {stage_counts.get('cleaned', 0)} new GitHub repos (after initial ignore).")
+    dropped_early = sum(counts.get("evaluated", 0) - counts.get("passed", 0)
+                        for name, counts in filter_stats.items() if name != "swe_bench")
+    print(f"{dropped_early} repos dropped before the SWE-Bench check "
+          f"(~{dropped_early * 60 / SWE_BENCH_REQUESTS_PER_MINUTE / 3600:.1f}h of SWE-Bench requests saved).")
+    if ENABLE_PYTHON_PERCENTAGE_FILTER:
+        print(f"{stage_counts.get('passed_python', 0)} repos passed Python percentage filter.")
+    if work_queue is not None:
+        counts = work_queue.counts()
+        print(f"{enqueued} repos added to the work queue {work_queue.path} "
+              f"({counts.get('queued', 0)} queued, {counts.get('leased', 0)} being checked).")
+        work_queue.close()
+    else:
+        print(f"{newly_passed_swe_bench} new repos passed SWE-Bench batch check.")
+    if revalidating:
+        revived = sum(registry.status_of(repo["html_url"]) == STATUS_SWE_PASSED for repo, _ in revalidating)
+        print(f"{revived} of {len(revalidating)} revalidated repos now pass the SWE-Bench check.")
 
-    # Also update FILTERED_REPOS_FILE to be the same as the final green list
-    with open(FILTERED_REPOS_FILE, "w", encoding="utf-8") as out:
-        json.dump(deduplicated_green_list, out, indent=2, ensure_ascii=False)
-    print(f"Updated {FILTERED_REPOS_FILE} to match the final green list.")
+    # Save the final green list
+    with metrics.stage("export"):
+        save_green_list(registry, export_json)
 
     print("\nPipeline finished.")
     print(f"Summary:")
-    print(f"  - Owned Repos: {len(owned_repo_urls)}")
-    print(f"  - Rejected by Python % (cumulative): {len(rejected_by_python_urls)}")
-    print(f"  - Failed SWE-Bench (cumulative): {len(failed_swe_bench_urls)}")
-    print(f"  - Final Green List ({SWE_BENCH_GREEN_LIST_FILE}): {len(deduplicated_green_list)}")
+    print(f"  - Owned Repos: {registry.count(STATUS_OWNED)}")
+    print(f"  - Rejected by pre-filters (cumulative): {registry.count(STATUS_REJECTED_PREFILTER)}")
+    print(f"  - Rejected by Python % (cumulative): {registry.count(STATUS_REJECTED_PYTHON)}")
+    print(f"  - Failed SWE-Bench (cumulative): {registry.count(STATUS_SWE_FAILED)}")
+    print(f"  - Final Green List ({SWE_BENCH_GREEN_LIST_NDJSON}): {registry.count(STATUS_SWE_PASSED)}")
+    print(f"  - GitHub HTTP cache hit rate: {get_default_cache().summary()}")
+    known_repos.close()
+    registry.close()
+
+    print_run_report(write_run_report(metrics, stage_counts, query_stats))
+
+
+def run_search(queries=None):
+    """
+    `search` stage: runs the GitHub searches (GITHUB_SEARCH_QUERIES unless
+    `queries` are given) and records every cleaned repo that is not in the
+    registry yet as "found", for `filter-python`.
+    """
+    from pagination import iter_github_repositories_multi, print_query_stats
+    from FilterRepo import iter_cleaned_repos
+    metrics = reset_metrics()
+    queries = queries or GITHUB_SEARCH_QUERIES
+    registry = RepoRegistry()
+    with metrics.stage("sync_owned"):
+        registry.sync_owned(OWNED_REPOS_FILE)
+    known_repos = MembershipIndex(registry)
+    stage_counts, query_stats = {}, {}
+    print(f"Fetching new repositories from GitHub with {len(queries)} queries: {'; '.join(queries)}")
+    items = buffered(counted(metrics.timed(iter_github_repositories_multi(queries, query_stats, known=known_repos),
+                                           "search"), stage_counts, "fetched"), name="search")
+    found = recorded(iter_cleaned_repos(known_repos, items), registry, STATUS_FOUND)
+    for _ in counted(metrics.timed(found, "clean"), stage_counts, "cleaned"):
+        pass
+    print(f"Fetched {stage_counts.get('fetched', 0)} items, {stage_counts.get('cleaned', 0)} new repos recorded "
+          f"as found ({registry.count(STATUS_FOUND)} waiting for filter-python).")
+    if query_stats:
+        print_query_stats(query_stats)
+    known_repos.close()
+    registry.close()
+    print_run_report(write_run_report(metrics, stage_counts, query_stats))
+
+
+def run_filter_python():
+    """
+    `filter-python` stage: puts the "found" repos, and expired filter
+    rejections within REVALIDATION_BUDGET, through the pre-filters and the
+    Python percentage check. Rejects are recorded by the filters, passes as
+    "passed_filters", for `check-swe-bench`.
+    """
+    metrics = reset_metrics()
+    registry = RepoRegistry()
+    requeue_prefilter_rejects(registry)
+    found = registry.repos(STATUS_FOUND)
+    expired = [repo for repo, _ in registry.expired(FILTER_TTL_DAYS, REVALIDATION_BUDGET)]
+    print(f"Filtering {len(found)} found repos and {len(expired)} expired rejections.")
+    stage_counts, filter_stats = {}, {}
+    planned_filters = build_filter_plan(registry, python_percentage_stage_for(registry, stage_counts))
+    passed = recorded(apply_filters(chain(expired, found), planned_filters, filter_stats, registry),
+                      registry, STATUS_PASSED_FILTERS)
+    for _ in counted(passed, stage_counts, "passed_filters"):
+        pass
+    registry.record_filter_stats(filter_stats)
+    print(f"{stage_counts.get('passed_filters', 0)} repos passed the filters "
+          f"({registry.count(STATUS_PASSED_FILTERS)} waiting for check-swe-bench).")
+    registry.close()
+    print_run_report(write_run_report(metrics, stage_counts))
+
+
+def run_check_swe_bench(enqueue=False):
+    """
+    `check-swe-bench` stage: checks the "passed_filters" repos, and expired
+    SWE-Bench failures within REVALIDATION_BUDGET, against SWE-Bench and
+    records the verdicts. With `enqueue` they are added to the work queue
+    for run_swe_bench_worker processes instead, after the verdicts the
+    workers have finished so far are collected into the registry.
+    """
+    metrics = reset_metrics()
+    registry = RepoRegistry()
+    work_queue = LeaseQueue() if enqueue else None
+    if work_queue is not None:
+        collect_verdicts(registry, work_queue)
+    repos = registry.repos(STATUS_PASSED_FILTERS)
+    repos += [repo for repo, _ in registry.expired(SWE_BENCH_TTL_DAYS, REVALIDATION_BUDGET)]
+    stage_counts = {}
+    if work_queue is not None:
+        with work_queue:
+            added = work_queue.enqueue(metrics.timed(repos, "enqueue"))
+            counts = work_queue.counts()
+        print(f"{added} of {len(repos)} repos added to the work queue {WORK_QUEUE_DB_FILE} "
+              f"({counts.get('queued', 0)} queued, {counts.get('leased', 0)} being checked).")
+    else:
+        from FilterRepo import iter_swe_bench_batches
+        print(f"Checking {len(repos)} repos against SWE-Bench.")
+        swe_bench_stats = {}
+        swe_bench = iter_swe_bench_batches(counted(repos, swe_bench_stats, "evaluated"),
+                                           get_swe_bench_header(include_user_agent=False), registry=registry)
+        for _ in counted(metrics.timed(swe_bench, "swe_bench"), swe_bench_stats, "passed"):
+            pass
+        # Only recorded for a complete stage: repos left without a verdict are checked again by the next one
+        registry.record_filter_stats({"swe_bench": swe_bench_stats})
+        stage_counts["passed"] = swe_bench_stats.get("passed", 0)
+        print(f"{stage_counts.get('passed', 0)} of {len(repos)} repos passed the SWE-Bench check; "
+              f"run 'python run.py merge' to update the green list.")
+    registry.close()
+    print_run_report(write_run_report(metrics, stage_counts))
+
+
+def run_swe_bench_worker(worker_id=None):
+    """
+    Checks repos from the work queue against SWE-Bench until it is empty.
+    Any number of workers, on this host or others sharing the queue file,
+    may run at once: together they stay within SWE_BENCH_REQUESTS_PER_MINUTE.
+    Verdicts go to the queue, to be collected by the next `merge` or
+    `run --enqueue`.
+    """
+    from FilterRepo import iter_swe_bench_batches
+    reset_metrics()
+    worker_id = worker_id or default_worker_id()
+    work_queue = LeaseQueue()
+    scheduler = SharedTokenBucketScheduler(work_queue.budget)
+    heartbeat = work_queue.start_heartbeat(worker_id)
+    print(f"Worker {worker_id} checking repos from {work_queue.path} "
+          f"({work_queue.counts().get('queued', 0)} queued).")
+    passed = 0
+    try:
+        swe_bench = iter_swe_bench_batches(work_queue.iter_claims(worker_id),
+                                           get_swe_bench_header(include_user_agent=False),
+                                           registry=work_queue, scheduler=scheduler)
+        for _ in swe_bench:
+            passed += 1
+    finally:
+        heartbeat.set()
+        released = work_queue.release(worker_id)
+        if released:
+            print(f"Handed {released} unfinished repos back to the work queue.")
+        work_queue.close()
+    print(f"Worker {worker_id} done: {passed} repos passed the SWE-Bench check.")
+
+
+def run_merge(export_json=EXPORT_GREEN_LIST_JSON):
+    """
+    `merge` stage: moves finished worker verdicts into the registry (if there
+    is a work queue) and brings the green list up to date with the registry.
+    """
+    registry = RepoRegistry()
+    if os.path.exists(WORK_QUEUE_DB_FILE):
+        with LeaseQueue() as work_queue:
+            collect_verdicts(registry, work_queue)
+            counts = work_queue.counts()
+        print(f"Work queue: {counts.get('queued', 0)} queued, {counts.get('leased', 0)} being checked, "
+              f"{counts.get('dead', 0)} dead.")
+    save_green_list(registry, export_json)
+    registry.close()
+
+
+def print_stats():
+    # `stats`: what the registry, the filter statistics and the work queue hold, without any network access
+    registry = RepoRegistry()
+    counts = registry.counts()
+    print(f"Registry ({sum(counts.values())} repos):")
+    for status in (STATUS_FOUND, STATUS_PASSED_FILTERS, STATUS_OWNED, STATUS_REJECTED_PREFILTER,
+                   STATUS_REJECTED_PYTHON, STATUS_SWE_FAILED, STATUS_SWE_PASSED):
+        print(f"  - {status}: {counts.pop(status, 0)}")
+    for status, count in counts.items():
+        print(f"  - {status}: {count}")
+    filter_stats = registry.filter_stats()
+    if filter_stats:
+        print("Filter pass rates (all runs):")
+        for name, (evaluated, passed) in filter_stats.items():
+            print(f"  - {name}: {passed} of {evaluated} ({passed / evaluated if evaluated else 0:.0%})")
+    runs = registry.recent_runs()
+    if runs:
+        print("Recent pipeline runs:")
+        for run in runs:
+            state = "finished" if run["finished_at"] else "search done" if run["search_done"] else "interrupted"
+            started = time.strftime("%Y-%m-%d %H:%M", time.localtime(run["started_at"]))
+            print(f"  - run {run['id']}: started {started}, {state}")
+    registry.close()
+    if os.path.exists(WORK_QUEUE_DB_FILE):
+        with LeaseQueue() as work_queue:
+            queue_counts = work_queue.counts()
+        summary = ", ".join(f"{count} {state}" for state, count in sorted(queue_counts.items()))
+        print(f"Work queue {WORK_QUEUE_DB_FILE}: {summary or 'empty'}")
+    print(f"Green list {SWE_BENCH_GREEN_LIST_NDJSON}: {len(GreenList())} repos")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find GitHub repos that pass the Python and SWE-Bench filters.")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    run_parser = commands.add_parser("run", help="run every stage in one streaming pipeline (the default)")
+    run_parser.add_argument("--resume", action="store_true",
+                            help="continue the last interrupted run without redoing its completed work")
+    run_parser.add_argument("--enqueue", action="store_true",
+                            help="add the repos that pass the filters to the work queue instead of checking them")
+    search_parser = commands.add_parser("search", help="search GitHub and record the new repos as found")
+    search_parser.add_argument("--query", action="append", dest="queries",
+                               help="search this query instead of GITHUB_SEARCH_QUERIES (repeatable)")
+    commands.add_parser("filter-python", help="run the pre-filters and the Python percentage check on found repos")
+    check_parser = commands.add_parser("check-swe-bench", help="check the repos that passed the filters on SWE-Bench")
+    mode = check_parser.add_mutually_exclusive_group()
+    mode.add_argument("--enqueue", action="store_true", help="add them to the work queue instead of checking them")
+    mode.add_argument("--worker", action="store_true",
+                      help="check repos from the work queue under the shared request budget until it is empty")
+    check_parser.add_argument("--worker-id", help="name of this worker in the work queue (default: host:pid)")
+    merge_parser = commands.add_parser("merge", help="collect work-queue verdicts and update the green list")
+    commands.add_parser("stats", help="show registry, filter and work-queue counts")
+    for command_parser in (run_parser, merge_parser):
+        command_parser.add_argument("--export-json", action="store_true", default=EXPORT_GREEN_LIST_JSON,
+                                    help=f"also export the green list ({SWE_BENCH_GREEN_LIST_FILE}) and the "
+                                         f"rejected and failed repos to the legacy JSON files")
+
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in commands.choices and argv[0] not in ("-h", "--help"):
+        argv = ["run"] + argv # `python run.py [--resume]` keeps running the whole pipeline
+    args = parser.parse_args(argv)
+    if args.command == "search":
+        run_search(args.queries)
+    elif args.command == "filter-python":
+        run_filter_python()
+    elif args.command == "check-swe-bench":
+        if args.worker:
+            run_swe_bench_worker(args.worker_id)
+        else:
+            run_check_swe_bench(enqueue=args.enqueue)
+    elif args.command == "merge":
+        run_merge(args.export_json)
+    elif args.command == "stats":
+        print_stats()
+    else:
+        run_filter_pipeline(resume=args.resume, enqueue=args.enqueue, export_json=args.export_json)
 
 
 if __name__ == "__main__":
-    if not hasattr(globals().get('get_github_repositories', None), '__call__'):
-        print("Defining a placeholder get_github_repositories for run.py to be executable.")
-        def get_github_repositories(query, max_pages=1, per_page_count=10): # Default to 1 page, 10 items for placeholder
-            print(f"  (Placeholder Pagination) Searching GitHub with query: {query}, max_pages={max_pages}")
-            all_items_placeholder = []
-            headers_placeholder = get_github_header()
-            for page_num in range(1, max_pages + 1):
-                url_placeholder = f"https://api.github.com/search/repositories?q={query}&per_page={per_page_count}&page={page_num}"
-                print(f"  (Placeholder Pagination) Fetching page {page_num}...")
-                try:
-                    response_placeholder = requests.get(url_placeholder, headers=headers_placeholder, timeout=15)
-                    response_placeholder.raise_for_status()
-                    results_placeholder = response_placeholder.json()
-                    items_placeholder = results_placeholder.get('items', [])
-                    if not items_placeholder:
-                        break
-                    all_items_placeholder.extend(items_placeholder)
-                    if len(items_placeholder) < per_page_count:
-                        break
-                except Exception as e_placeholder:
-                    print(f"  (Placeholder Pagination) Error fetching page {page_num}: {e_placeholder}")
-                    break
-            return all_items_placeholder
-        globals()['get_github_repositories'] = get_github_repositories
-
-    run_filter_pipeline()
+    main()
@@ -0,0 +1,243 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from metrics import get_metrics
+from config import (SWE_BENCH_SCHEDULER, SWE_BENCH_REQUESTS_PER_MINUTE, SWE_BENCH_MIN_REQUESTS_PER_MINUTE,
+                    SWE_BENCH_RECOVERY_PER_MINUTE, SWE_BENCH_BACKOFF_MULTIPLIER, SWE_BENCH_BURST,
+                    SWE_BENCH_MAX_IN_FLIGHT, SWE_BENCH_MIN_DELAY, SWE_BENCH_MAX_DELAY,
+                    SWE_BENCH_MAX_CONSECUTIVE_REQUESTS, SWE_BENCH_LONG_PAUSE_DURATION)
+
+# Request outcomes reported to RateScheduler.release
+OUTCOME_SUCCESS = "success"
+OUTCOME_THROTTLED = "throttled" # 429 / 503, possibly with Retry-After
+OUTCOME_ERROR = "error"
+OUTCOME_CLIENT_ERROR = "client_error" # 4xx other than 429, e.g. a 404: says nothing about server load
+
+
+class RateScheduler:
+    """
+    Decides when the next request may start. Callers wrap every request in
+    acquire() / release(outcome), from as many threads as max_in_flight.
+    Subclasses implement _wait_for_slot and _on_release.
+    """
+
+    def __init__(self, max_in_flight=1):
+        self.max_in_flight = max_in_flight
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self.started_at = None
+        self.completed = 0
+        self.errors = 0
+        self.throttled = 0
+        self.sleep_seconds = 0.0
+
+    def acquire(self):
+        self._in_flight.acquire()
+        try:
+            self._wait_for_slot()
+        except BaseException:
+            self._in_flight.release()
+            raise
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = time.monotonic()
+
+    def release(self, outcome=OUTCOME_SUCCESS, retry_after=None):
+        with self._lock:
+            self.completed += 1
+            if outcome == OUTCOME_ERROR:
+                self.errors += 1
+            elif outcome == OUTCOME_THROTTLED:
+                self.throttled += 1
+            self._on_release(outcome, retry_after)
+        self._in_flight.release()
+
+    def _sleep(self, seconds):
+        if seconds > 0:
+            with self._lock:
+                self.sleep_seconds += seconds
+            get_metrics().record_sleep("swe_bench_pacing", seconds)
+            time.sleep(seconds)
+
+    def requests_per_hour(self):
+        # Measured throughput since the first request started
+        if self.started_at is None:
+            return 0.0
+        elapsed = time.monotonic() - self.started_at
+        return self.completed * 3600 / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"{self.completed} requests at {self.requests_per_hour():.0f} requests/hour "
+                f"({self.throttled} throttled, {self.errors} errors, {self.sleep_seconds:.0f}s spent waiting)")
+
+    def _wait_for_slot(self):
+        raise NotImplementedError
+
+    def _on_release(self, outcome, retry_after):
+        raise NotImplementedError
+
+
+class FixedDelayScheduler(RateScheduler):
+    """
+    The original behaviour: a random SWE_BENCH_MIN_DELAY..SWE_BENCH_MAX_DELAY
+    sleep between requests and a long pause after every
+    SWE_BENCH_MAX_CONSECUTIVE_REQUESTS requests. Failed requests count towards
+    the pause as well, since they cost the server just as much.
+    """
+
+    def __init__(self, min_delay=SWE_BENCH_MIN_DELAY, max_delay=SWE_BENCH_MAX_DELAY,
+                 max_consecutive=SWE_BENCH_MAX_CONSECUTIVE_REQUESTS, long_pause=SWE_BENCH_LONG_PAUSE_DURATION):
+        super().__init__(max_in_flight=1)
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_consecutive = max_consecutive
+        self.long_pause = long_pause
+        self.consecutive_requests = 0
+        self._retry_after = 0
+
+    def _wait_for_slot(self):
+        if self.started_at is None:
+            return # No delay before the very first request
+        if self._retry_after:
+            print(f"  Server asked us to back off. Sleeping {self._retry_after}s...")
+            self._sleep(self._retry_after)
+            self._retry_after = 0
+        elif self.consecutive_requests >= self.max_consecutive:
+            print(f"Reached {self.max_consecutive} consecutive requests. Pausing for {self.long_pause}s...")
+            self._sleep(self.long_pause)
+            self.consecutive_requests = 0
+        else:
+            sleep_duration = random.uniform(self.min_delay, self.max_delay)
+            print(f"  Sleeping for {sleep_duration:.2f} seconds...")
+            self._sleep(sleep_duration)
+
+    def _on_release(self, outcome, retry_after):
+        self.consecutive_requests += 1
+        if outcome == OUTCOME_THROTTLED and retry_after:
+            self._retry_after = retry_after
+
+
+class AdaptiveTokenBucketScheduler(RateScheduler):
+    """
+    Token bucket refilled at the current rate, which starts at (and never
+    exceeds) `requests_per_minute`. Errors and throttling cut the rate by
+    `backoff_multiplier`; every success adds `recovery_per_minute` back (AIMD).
+    Client errors leave the rate as it is.
+    A Retry-After from a 429/503 blocks all requests until it has passed.
+    """
+
+    def __init__(self, requests_per_minute=SWE_BENCH_REQUESTS_PER_MINUTE,
+                 min_requests_per_minute=SWE_BENCH_MIN_REQUESTS_PER_MINUTE,
+                 recovery_per_minute=SWE_BENCH_RECOVERY_PER_MINUTE, backoff_multiplier=SWE_BENCH_BACKOFF_MULTIPLIER,
+                 burst=SWE_BENCH_BURST, max_in_flight=SWE_BENCH_MAX_IN_FLIGHT):
+        super().__init__(max_in_flight=max_in_flight)
+        self.target_rate = requests_per_minute / 60
+        self.min_rate = min_requests_per_minute / 60
+        self.recovery = recovery_per_minute / 60
+        self.backoff_multiplier = backoff_multiplier
+        self.burst = burst
+        self.rate = self.target_rate
+        self.tokens = float(burst)
+        self.blocked_until = 0.0
+        self._refilled_at = time.monotonic()
+        self._bucket_lock = threading.Lock()
+
+    def _wait_for_slot(self):
+        while True:
+            with self._bucket_lock:
+                wait = self._take_token(time.monotonic())
+            if not wait:
+                return
+            self._sleep(wait)
+
+    def _on_release(self, outcome, retry_after):
+        with self._bucket_lock:
+            self._adjust_rate(outcome, retry_after, time.monotonic())
+
+    def _take_token(self, now):
+        # Takes a token and returns 0, or returns how long to wait for one
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def _adjust_rate(self, outcome, retry_after, now):
+        if outcome == OUTCOME_SUCCESS:
+            self.rate = min(self.target_rate, self.rate + self.recovery)
+            return
+        if outcome == OUTCOME_CLIENT_ERROR:
+            return
+        self.rate = max(self.min_rate, self.rate * self.backoff_multiplier)
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+            # Don't fire a burst the moment the block ends
+            self.tokens = 0.0
+        print(f"  Backing off: SWE-Bench request rate lowered to {self.rate * 60:.1f}/min.")
+
+
+class SharedTokenBucketScheduler(AdaptiveTokenBucketScheduler):
+    """
+    AdaptiveTokenBucketScheduler whose bucket, rate and Retry-After block
+    live in `budget` (see work_queue.LeaseQueue.budget) instead of in this
+    process, so that every worker sharing the budget stays within one
+    combined request rate. Throttling seen by one worker slows them all.
+    Times are wall-clock, as the workers may run on different hosts.
+    """
+
+    def __init__(self, budget, **kwargs):
+        super().__init__(**kwargs)
+        self.budget = budget
+
+    def _load(self, state):
+        if not state:
+            state.update(rate=self.target_rate, tokens=float(self.burst), refilled_at=time.time(), blocked_until=0.0)
+        # The target may have been lowered in config since the budget was written
+        self.rate = min(state["rate"], self.target_rate)
+        self.tokens = state["tokens"]
+        self._refilled_at = state["refilled_at"]
+        self.blocked_until = state["blocked_until"]
+
+    def _save(self, state):
+        state.update(rate=self.rate, tokens=self.tokens, refilled_at=self._refilled_at,
+                     blocked_until=self.blocked_until)
+
+    def _wait_for_slot(self):
+        while True:
+            with self._bucket_lock, self.budget() as state:
+                self._load(state)
+                wait = self._take_token(time.time())
+                self._save(state)
+            if not wait:
+                return
+            self._sleep(wait)
+
+    def _on_release(self, outcome, retry_after):
+        with self._bucket_lock, self.budget() as state:
+            self._load(state)
+            self._adjust_rate(outcome, retry_after, time.time())
+            self._save(state)
+
+
+def create_swe_bench_scheduler(kind=SWE_BENCH_SCHEDULER):
+    if kind == "fixed":
+        return FixedDelayScheduler()
+    if kind == "adaptive":
+        return AdaptiveTokenBucketScheduler()
+    raise ValueError(f"Unknown SWE-Bench scheduler '{kind}'. Use 'adaptive' or 'fixed'.")
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return int(value.strip())
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,85 @@
+import time
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree
+from config import SWE_BENCH_PARSER
+
+# The batch table on a SWE-Bench repo page and the rows that stand for one batch each
+BATCH_TBODY_CLASS = "bg-white divide-y divide-gray-200"
+BATCH_ROW_CLASS = "hover:bg-gray-50 cursor-pointer"
+
+FEED_CHUNK_SIZE = 64 * 1024
+
+
+def count_batches_bs4(content):
+    """
+    Reference implementation: builds the full BeautifulSoup tree.
+    Returns the number of batch rows, or None if the page has no batch table.
+    """
+    soup = BeautifulSoup(content, 'lxml')
+    tbody_tag = soup.find("tbody", class_=BATCH_TBODY_CLASS)
+    if not tbody_tag:
+        return None
+    return len(tbody_tag.find_all("tr", class_=BATCH_ROW_CLASS))
+
+
+def count_batches_strained(content):
+    # Same as count_batches_bs4, but only <tbody> subtrees are turned into a tree. The
+    # class is matched afterwards, since the strainer sees the raw, unnormalized attribute.
+    soup = BeautifulSoup(content, 'lxml', parse_only=SoupStrainer("tbody"))
+    tbody_tag = soup.find("tbody", class_=BATCH_TBODY_CLASS)
+    if not tbody_tag:
+        return None
+    return len(tbody_tag.find_all("tr", class_=BATCH_ROW_CLASS))
+
+
+def _has_class(element, expected):
+    # bs4 compares a multi-valued class against its whitespace-normalized value
+    return " ".join((element.get("class") or "").split()) == expected
+
+
+def count_batches_lxml(content):
+    """
+    Streams the page through lxml's pull parser, counting batch rows as their
+    start tags go by, and stops as soon as the batch table's </tbody> is seen.
+    Parsed elements are discarded on the way, so memory stays flat.
+    """
+    parser = etree.HTMLPullParser(events=("start", "end"))
+    target = None
+    count = 0
+    for offset in range(0, max(len(content), 1), FEED_CHUNK_SIZE):
+        parser.feed(content[offset:offset + FEED_CHUNK_SIZE])
+        for event, element in parser.read_events():
+            if event == "start":
+                if target is None:
+                    if element.tag == "tbody" and _has_class(element, BATCH_TBODY_CLASS):
+                        target = element
+                elif element.tag == "tr" and _has_class(element, BATCH_ROW_CLASS):
+                    count += 1
+            elif element is target:
+                return count
+            elif target is None:
+                element.clear()
+    parser.close()
+    # An unclosed table still counts, as it would for BeautifulSoup
+    return count if target is not None else None
+
+
+PARSERS = {
+    "bs4": count_batches_bs4,
+    "strainer": count_batches_strained,
+    "lxml": count_batches_lxml,
+}
+
+
+def count_batches(content, parser=SWE_BENCH_PARSER):
+    """
+    Returns the number of SWE-Bench batches listed on a repo page (raw bytes
+    or str), or None if the page has no batch table.
+    """
+    return PARSERS[parser](content)
+
+
+def count_batches_timed(content, parser=SWE_BENCH_PARSER):
+    # For parser processes: returns (batch count, seconds spent parsing)
+    started = time.perf_counter()
+    return count_batches(content, parser), time.perf_counter() - started
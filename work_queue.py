@@ -0,0 +1,249 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from config import (WORK_QUEUE_DB_FILE, WORK_QUEUE_LEASE_SECONDS, WORK_QUEUE_HEARTBEAT_SECONDS,
+                    WORK_QUEUE_MAX_ATTEMPTS, WORK_QUEUE_POLL_SECONDS)
+
+# Task states
+STATE_QUEUED = "queued"
+STATE_LEASED = "leased"
+STATE_DONE = "done" # verdict holds the registry status, waiting to be collected
+STATE_DEAD = "dead" # its lease expired WORK_QUEUE_MAX_ATTEMPTS times
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    url TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    state TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    verdict TEXT,
+    done_at REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, enqueued_at);
+CREATE INDEX IF NOT EXISTS tasks_lease_owner ON tasks (lease_owner);
+CREATE TABLE IF NOT EXISTS rate_budget (
+    name TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+"""
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseQueue:
+    """
+    SQLite-backed queue of repos waiting for the SWE-Bench check, shared by
+    worker processes on one or more hosts.
+
+    A worker claims one repo at a time under a lease that its heartbeat keeps
+    renewing. If the worker dies, the lease runs out and the repo is handed
+    to the next worker that asks; a repo whose lease has run out
+    `max_attempts` times is set aside as dead. Workers record verdicts here
+    (the queue has the registry's record_verdicts interface) and
+    run.collect_verdicts moves them into the registry, so only the queue file
+    needs to be shared.
+
+    The file uses a rollback journal rather than WAL, which needs shared
+    memory and so does not work across hosts. Every change is a short
+    BEGIN IMMEDIATE transaction.
+    """
+
+    def __init__(self, path=WORK_QUEUE_DB_FILE, lease_seconds=WORK_QUEUE_LEASE_SECONDS,
+                 max_attempts=WORK_QUEUE_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Transactions are managed explicitly, see _transaction
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def _transaction(self):
+        # Takes the write lock up front, so concurrent claims never race each other
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def __contains__(self, url):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM tasks WHERE url = ?", (url,)).fetchone() is not None
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) AS n FROM tasks GROUP BY state").fetchall()
+        return {row["state"]: row["n"] for row in rows}
+
+    def enqueue(self, repos):
+        """
+        Adds repos to the queue as they arrive, one commit each so workers can
+        start on them straight away. A repo already queued or leased is left
+        alone, and so is one that is done, until its verdict is collected;
+        one that is dead is queued again. Returns how many repos were added.
+        """
+        added = 0
+        for repo in repos:
+            with self._transaction():
+                added += self._conn.execute("""
+                    INSERT INTO tasks (url, data, state, enqueued_at) VALUES (?, ?, 'queued', ?)
+                    ON CONFLICT (url) DO UPDATE SET data = excluded.data, state = 'queued',
+                        enqueued_at = excluded.enqueued_at, attempts = 0, lease_owner = NULL,
+                        lease_expires = NULL, verdict = NULL, done_at = NULL
+                    WHERE state = 'dead'
+                """, (repo["html_url"], json.dumps(repo, ensure_ascii=False), time.time())).rowcount
+        return added
+
+    def claim(self, worker_id):
+        """
+        Leases the oldest queued repo, or one whose lease has expired, to
+        `worker_id` and returns it. Returns None if there is none.
+        """
+        while True:
+            with self._transaction():
+                now = time.time()
+                row = self._conn.execute("""
+                    SELECT url, data, attempts, lease_owner FROM tasks
+                    WHERE state = 'queued' OR (state = 'leased' AND lease_expires < ?)
+                    ORDER BY enqueued_at LIMIT 1
+                """, (now,)).fetchone()
+                if row is None:
+                    return None
+                if row["attempts"] >= self.max_attempts:
+                    self._conn.execute("UPDATE tasks SET state = 'dead', lease_owner = NULL WHERE url = ?",
+                                       (row["url"],))
+                    print(f"  Work queue: giving up on {row['url']} after {row['attempts']} expired leases.")
+                    continue
+                if row["lease_owner"]:
+                    print(f"  Work queue: reclaiming {row['url']} from {row['lease_owner']}, whose lease expired.")
+                self._conn.execute("""
+                    UPDATE tasks SET state = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1
+                    WHERE url = ?
+                """, (worker_id, now + self.lease_seconds, row["url"]))
+                return json.loads(row["data"])
+
+    def iter_claims(self, worker_id, poll_seconds=WORK_QUEUE_POLL_SECONDS):
+        """
+        Yields repos claimed for `worker_id`, one per request for the next
+        item, and stops when nothing is claimable. An idle worker (one
+        holding no leases itself) first waits for the leases of other
+        workers to be finished or to expire; a busy one must not, as its
+        caller only records its verdicts after asking for the next item.
+        """
+        while True:
+            repo = self.claim(worker_id)
+            if repo is not None:
+                yield repo
+                continue
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT lease_owner = ? AS own, COUNT(*) AS n FROM tasks WHERE state = 'leased' GROUP BY own",
+                    (worker_id,)).fetchall()
+            held = {bool(row["own"]): row["n"] for row in rows}
+            if held.get(True) or not held.get(False):
+                return
+            time.sleep(poll_seconds)
+
+    def renew(self, worker_id):
+        # Extends every lease held by worker_id; returns how many it holds
+        with self._transaction():
+            return self._conn.execute("UPDATE tasks SET lease_expires = ? WHERE state = 'leased' AND lease_owner = ?",
+                                      (time.time() + self.lease_seconds, worker_id)).rowcount
+
+    def release(self, worker_id):
+        # Hands the repos leased to worker_id back to the queue, e.g. when it is stopped
+        with self._transaction():
+            return self._conn.execute("""
+                UPDATE tasks SET state = 'queued', lease_owner = NULL, lease_expires = NULL,
+                    attempts = MAX(attempts - 1, 0)
+                WHERE state = 'leased' AND lease_owner = ?
+            """, (worker_id,)).rowcount
+
+    def start_heartbeat(self, worker_id, interval=WORK_QUEUE_HEARTBEAT_SECONDS):
+        """
+        Renews worker_id's leases every `interval` seconds on a daemon thread
+        until the returned event is set.
+        """
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(interval):
+                try:
+                    self.renew(worker_id)
+                except sqlite3.Error as e:
+                    # A missed beat is fine as long as a later one gets through before the lease runs out
+                    print(f"  Work queue: could not renew the leases of {worker_id}: {e}")
+
+        threading.Thread(target=beat, name=f"heartbeat-{worker_id}", daemon=True).start()
+        return stop
+
+    def record_verdicts(self, verdicts):
+        # Same interface as RepoRegistry.record_verdicts: (repo dict or html_url, status) pairs
+        now = time.time()
+        rows = []
+        for repo, status in verdicts:
+            if isinstance(repo, str):
+                url, data = repo, None
+            else:
+                url, data = repo.get("html_url"), json.dumps(repo, ensure_ascii=False)
+            if url:
+                rows.append((status, data, now, url))
+        if not rows:
+            return
+        with self._transaction():
+            self._conn.executemany("""
+                UPDATE tasks SET state = 'done', verdict = ?, data = COALESCE(?, data), done_at = ?,
+                    lease_owner = NULL, lease_expires = NULL
+                WHERE url = ?
+            """, rows)
+
+    def finished(self):
+        # Returns the (repo, status) verdicts recorded by the workers, oldest first
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data, verdict FROM tasks WHERE state = 'done' ORDER BY done_at").fetchall()
+        return [(json.loads(row["data"]), row["verdict"]) for row in rows]
+
+    def remove(self, urls):
+        with self._transaction():
+            self._conn.executemany("DELETE FROM tasks WHERE url = ? AND state = 'done'", ((url,) for url in urls))
+
+    @contextmanager
+    def budget(self, name="swe_bench"):
+        """
+        Yields the shared rate budget `name` as a dict (empty the first time)
+        and writes it back when the block ends, all in one transaction, so
+        that concurrent workers see and update it one at a time. See
+        scheduler.SharedTokenBucketScheduler.
+        """
+        with self._transaction():
+            row = self._conn.execute("SELECT state FROM rate_budget WHERE name = ?", (name,)).fetchone()
+            state = json.loads(row["state"]) if row else {}
+            yield state
+            self._conn.execute("INSERT OR REPLACE INTO rate_budget (name, state) VALUES (?, ?)",
+                               (name, json.dumps(state)))